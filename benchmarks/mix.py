@@ -0,0 +1,255 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# Microbenchmarks of the audio state mix path.
+#
+# Runs offline with synthetic PCM sources and stand-in voice client, and
+# measures ``AudioState.read`` across source counts, fragment sizes, volume
+# settings and mixer backends.
+#
+# Usage:
+#   python benchmarks/mix.py --output results.json
+#   python benchmarks/mix.py --output new.json --compare results.json
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import discord
+
+from concord.ext.audio import AudioState, version
+from concord.ext.audio.constants import FRAME_SIZE
+from concord.ext.audio.mixer import AudioopMixer, Mixer, NumpyMixer, numpy
+
+
+SOURCE_COUNTS = (1, 2, 4, 8, 16, 32)
+FRAGMENT_SIZES = {
+    "frame": (FRAME_SIZE,),
+    "mixed": (FRAME_SIZE, 1000, 5760, 2048, 7680),
+}
+VOLUMES = {"unity": (1.0, 1.0), "scaled": (0.5, 0.8)}
+
+
+class SyntheticSource(discord.AudioSource):
+    """Endless PCM source, that returns precomputed fragments."""
+
+    def __init__(self, size: int):
+        self._fragment = os.urandom(size)
+
+    def read(self) -> bytes:
+        return self._fragment
+
+
+class StandInLoop:
+    """Loop, that collects callbacks, scheduled by the audio state."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def call_soon_threadsafe(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+    def run_pending(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback, args in callbacks:
+            callback(*args)
+
+
+class StandInVoiceClient(discord.VoiceClient):
+    """Voice client, that is always connected and plays nothing."""
+
+    def __init__(self, loop: StandInLoop):
+        self.loop = loop
+        self._player = None
+
+    def is_connected(self) -> bool:
+        return True
+
+    def play(self, source, *, after=None):
+        self._player = source
+
+    def stop(self):
+        self._player = None
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    async def disconnect(self, *, force=False):
+        pass
+
+
+def mixers() -> Dict[str, Callable[[], Mixer]]:
+    result = {"audioop": AudioopMixer}
+    if numpy is not None:
+        result["numpy"] = NumpyMixer
+    return result
+
+
+def build_state(
+    mixer: Mixer, sources: int, sizes, volumes
+) -> Tuple[AudioState, StandInLoop]:
+    loop = StandInLoop()
+    audio_state = AudioState(0, mixer=mixer)
+    audio_state.set_voice_client(StandInVoiceClient(loop))
+    audio_state.master_volume = volumes[1]
+
+    for size in itertools.islice(itertools.cycle(sizes), sources):
+        audio_state.add_source(SyntheticSource(size), volume=volumes[0])
+    return audio_state, loop
+
+
+def measure(audio_state: AudioState, loop: StandInLoop, frames: int) -> Dict:
+    read = audio_state.read
+    timings = []
+
+    for _ in range(frames // 10):
+        read()
+    loop.run_pending()
+
+    blocks = sys.getallocatedblocks()
+    for _ in range(frames):
+        start = time.perf_counter()
+        read()
+        timings.append(time.perf_counter() - start)
+    blocks = sys.getallocatedblocks() - blocks
+    loop.run_pending()
+
+    tracemalloc.start()
+    for _ in range(min(frames, 100)):
+        read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        "frames": frames,
+        "mean_us": total / frames * 1e6,
+        "p50_us": timings[frames // 2] * 1e6,
+        "p99_us": timings[min(frames - 1, frames * 99 // 100)] * 1e6,
+        "max_us": timings[-1] * 1e6,
+        "frames_per_second": frames / total,
+        "retained_blocks": blocks,
+        "peak_traced_bytes": peak,
+    }
+
+
+def run(frames: int, source_counts: List[int]) -> List[Dict]:
+    results = []
+
+    for mixer_name, mixer_factory in mixers().items():
+        for sizes_name, sizes in FRAGMENT_SIZES.items():
+            for volumes_name, volumes in VOLUMES.items():
+                for sources in source_counts:
+                    audio_state, loop = build_state(
+                        mixer_factory(), sources, sizes, volumes
+                    )
+                    result = {
+                        "name": "/".join(
+                            (mixer_name, sizes_name, volumes_name, str(sources))
+                        ),
+                        "mixer": mixer_name,
+                        "fragments": sizes_name,
+                        "volume": volumes_name,
+                        "sources": sources,
+                    }
+                    result.update(measure(audio_state, loop, frames))
+                    results.append(result)
+                    print(
+                        f"{result['name']:<28} "
+                        f"mean {result['mean_us']:9.1f} us  "
+                        f"p99 {result['p99_us']:9.1f} us"
+                    )
+
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str, threshold: float):
+    with open(baseline_path) as file:
+        baseline = {
+            result["name"]: result for result in json.load(file)["results"]
+        }
+
+    regressions = 0
+    for result in results:
+        previous = baseline.get(result["name"])
+        if previous is None:
+            continue
+        ratio = result["mean_us"] / previous["mean_us"]
+        if ratio > 1 + threshold:
+            regressions += 1
+            print(f"REGRESSION {result['name']:<28} x{ratio:.2f}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks of the audio state mix path."
+    )
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument(
+        "--sources",
+        type=int,
+        nargs="+",
+        default=list(SOURCE_COUNTS),
+        help="Source counts to benchmark",
+    )
+    parser.add_argument("--output", help="Path to save results as JSON")
+    parser.add_argument("--compare", help="Path to previous results as JSON")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed slowdown of mean frame time, when comparing",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.frames, args.sources)
+    document = {
+        "version": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": numpy.__version__ if numpy is not None else None,
+        "timestamp": time.time(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(document, file, indent=2)
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
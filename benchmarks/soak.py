@@ -0,0 +1,657 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# Soak test of the whole extension under sustained load.
+#
+# Runs offline on one box. Creates fake guilds, members, text and voice
+# channels, drives audio commands through the extension middleware with
+# synthetic message events, adds and removes synthetic sources at given rates
+# and plays every audio state at real 20 ms cadence, either by discord.py
+# player threads or by the mixing engine. Reports deadline misses, frame
+# jitter, RSS growth and event loop lag.
+#
+# Usage:
+#   python benchmarks/soak.py --guilds 1000 --duration 600
+#   python benchmarks/soak.py --guilds 1000 --engine-threads 4 --output soak.json
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import discord
+from discord.player import AudioPlayer
+
+from concord.constants import EventType
+from concord.context import Context
+from concord.middleware import MiddlewareState, chain_of, sequence_of
+from concord.utils import empty_next_callable
+
+from concord.ext.audio import (
+    AudioExtension,
+    AudioStatus,
+    ConnectionManager,
+    Histogram,
+    State,
+    version,
+)
+from concord.ext.audio.constants import FRAME_LENGTH, FRAME_SIZE
+
+DELAY = FRAME_LENGTH / 1000
+LAG_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.0075,
+    0.01,
+    0.015,
+    0.02,
+    0.03,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+CHATTER = ("hello", "what are we listening to?", "brb", "nice track")
+
+
+class SyntheticSource(discord.AudioSource):
+    """Finite PCM source, that returns precomputed frames."""
+
+    FRAMES = [os.urandom(FRAME_SIZE) for _ in range(8)]
+
+    def __init__(self, frames: int):
+        self._frames = frames
+        self._fragment = random.choice(self.FRAMES)
+
+    def read(self) -> bytes:
+        if self._frames <= 0:
+            return b""
+        self._frames -= 1
+        return self._fragment
+
+
+class PacketStats:
+    """Timings of packets, sent via one voice client.
+
+    Lateness is measured against the ideal 20 ms clock, that is anchored on
+    the earliest packet since the last transmission start, so constant offset
+    of the player is not counted.
+    """
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.packets = 0
+        self.misses = 0
+        self.bad_frames = 0
+        self.jitter = Histogram(LAG_BUCKETS)
+        self.lateness = Histogram(LAG_BUCKETS)
+        self.restart()
+
+    def restart(self):
+        # Player of discord.py sleeps for two frames after the first one, so
+        # the first interval is not counted.
+        self._warm_up = 2
+        self._last = None
+        self._anchor = None
+        self._sent = 0
+
+    def observe(self, data: bytes, encode: bool, now: float):
+        self.packets += 1
+        if encode and len(data) != FRAME_SIZE:
+            self.bad_frames += 1
+
+        if self._warm_up > 0:
+            self._warm_up -= 1
+        else:
+            interval = now - self._last
+            self.jitter.observe(abs(interval - DELAY))
+            if interval > self.deadline:
+                self.misses += 1
+            phase = now - DELAY * self._sent
+            if self._anchor is None or phase < self._anchor:
+                self._anchor = phase
+            self.lateness.observe(phase - self._anchor)
+            self._sent += 1
+        self._last = now
+
+
+class StandInWebSocket:
+    """Voice websocket, that marks the end of transmission."""
+
+    def __init__(self, stats: PacketStats):
+        self._stats = stats
+
+    async def speak(self, speaking: bool = True):
+        if not speaking:
+            self._stats.restart()
+
+
+class StandInVoiceClient(discord.VoiceClient):
+    """Voice client, that plays with discord.py player and sends nothing."""
+
+    def __init__(self, loop, channel, stats: PacketStats):
+        self.loop = loop
+        self.channel = channel
+        self.encoder = None
+        self.ws = StandInWebSocket(stats)
+        self.stats = stats
+        self._player = None
+        self._connected = threading.Event()
+        self._connected.set()
+
+    def play(self, source, *, after=None):
+        # Encoder is not needed, since nothing is sent.
+        if self.is_playing():
+            raise discord.ClientException("Already playing audio.")
+        self.stats.restart()
+        self._player = AudioPlayer(source, self, after=after)
+        self._player.start()
+
+    def pause(self):
+        self.stats.restart()
+        super().pause()
+
+    def resume(self):
+        self.stats.restart()
+        super().resume()
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+    async def disconnect(self, *, force=False):
+        self._connected.clear()
+        self.stop()
+        self.channel.guild.stand_in_voice_client = None
+
+    def send_audio_packet(self, data, *, encode=True):
+        self.stats.observe(data, encode, time.perf_counter())
+
+
+class StandInGuild(discord.Guild):
+    """Guild with one member, one text and two voice channels."""
+
+    def __init__(self, id: int):
+        self.id = id
+        self.stand_in_voice_client = None
+        self.sources = set()
+        self.stand_in_text_channel = StandInTextChannel(self, id * 10 + 1)
+        self.stand_in_voice_channels = (
+            StandInVoiceChannel(self, id * 10 + 2),
+            StandInVoiceChannel(self, id * 10 + 3),
+        )
+        self.stand_in_member = StandInMember(self, id * 10 + 4)
+
+    @property
+    def voice_client(self):
+        return self.stand_in_voice_client
+
+
+class StandInTextChannel(discord.TextChannel):
+    """Text channel, that counts replies."""
+
+    def __init__(self, guild: StandInGuild, id: int):
+        self.guild = guild
+        self.id = id
+        self.replies = 0
+
+    async def send(self, content=None, **kwargs):
+        self.replies += 1
+
+
+class StandInVoiceChannel(discord.VoiceChannel):
+    """Voice channel, that connects with simulated latency and failures."""
+
+    def __init__(self, guild: StandInGuild, id: int):
+        self.guild = guild
+        self.id = id
+
+    async def connect(self, *, timeout=60.0, reconnect=True, cls=None):
+        harness = Harness.current
+        await asyncio.sleep(
+            random.expovariate(1 / harness.args.connect_latency)
+        )
+        if random.random() < harness.args.connect_failures:
+            harness.connect_failures += 1
+            raise asyncio.TimeoutError()
+
+        voice_client = StandInVoiceClient(
+            asyncio.get_event_loop(), self, harness.new_stats()
+        )
+        self.guild.stand_in_voice_client = voice_client
+        return voice_client
+
+
+class StandInMember(discord.Member):
+    """Member, that is not a bot and can move between voice channels."""
+
+    def __init__(self, guild: StandInGuild, id: int):
+        self.guild = guild
+        self.voice_state = None
+
+    @property
+    def bot(self) -> bool:
+        return False
+
+    @property
+    def voice(self):
+        return self.voice_state
+
+
+class StandInMessage(discord.Message):
+    """Message, sent by the member to the text channel."""
+
+    def __init__(self, guild: StandInGuild, content: str):
+        self.guild = guild
+        self.channel = guild.stand_in_text_channel
+        self.author = guild.stand_in_member
+        self.content = content
+
+
+class Harness:
+    """Drives guilds with synthetic events and collects statistics."""
+
+    current: Optional["Harness"] = None
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.state = State(
+            engine_threads=args.engine_threads,
+            idle_timeout=args.idle_timeout,
+            block_frames=args.block_frames,
+            connection_manager=ConnectionManager(limit=args.connect_limit),
+            source_budget=(
+                args.source_budget / 1000
+                if args.source_budget is not None
+                else None
+            ),
+        )
+        # Same chain, as built by the extension manager for the client.
+        extension = AudioExtension()
+        self.middleware = chain_of(
+            [sequence_of(extension.extension_middleware)]
+        )
+        self.middleware.add_middleware(MiddlewareState(self.state))
+
+        self.guilds = [StandInGuild(id) for id in range(1, args.guilds + 1)]
+        self.stats: List[PacketStats] = []
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.events = 0
+        self.connect_failures = 0
+        self.sources_added = 0
+        self.sources_finalized = 0
+        self.finalize_reasons: Dict[str, int] = {}
+        self.rss: List[Dict[str, float]] = []
+        self.stopped: Optional[asyncio.Event] = None
+
+    def new_stats(self) -> PacketStats:
+        stats = PacketStats(self.args.deadline / 1000)
+        self.stats.append(stats)
+        return stats
+
+    async def dispatch(self, guild: StandInGuild, content: str):
+        self.events += 1
+        ctx = Context(None, EventType.MESSAGE, StandInMessage(guild, content))
+        await self.middleware.run(ctx=ctx, next=empty_next_callable)
+
+    async def join(self, guild: StandInGuild):
+        channel = random.choice(guild.stand_in_voice_channels)
+        guild.stand_in_member.voice_state = discord.VoiceState(
+            data={}, channel=channel
+        )
+        await self.dispatch(guild, "join")
+
+    def add_source(self, guild: StandInGuild):
+        audio_state = self.state.get_audio_state(guild)
+        if audio_state.voice_client is None:
+            return
+        if len(guild.sources) >= self.args.max_sources:
+            return
+        seconds = random.uniform(self.args.min_length, self.args.max_length)
+        source = SyntheticSource(int(seconds / DELAY))
+        audio_state.add_source(
+            source,
+            finalizer=functools.partial(self.on_source_finalized, guild),
+            volume=random.uniform(0.5, 1.0),
+            prefetch=self.args.prefetch,
+        )
+        guild.sources.add(source)
+        self.sources_added += 1
+
+    def remove_source(self, guild: StandInGuild):
+        if len(guild.sources) > 0:
+            source = random.choice(tuple(guild.sources))
+            self.state.get_audio_state(guild).remove_source(source)
+
+    def on_source_finalized(
+        self, guild: StandInGuild, source, reason: AudioStatus
+    ):
+        guild.sources.discard(source)
+        self.sources_finalized += 1
+        self.finalize_reasons[reason.name] = (
+            self.finalize_reasons.get(reason.name, 0) + 1
+        )
+
+    async def drive(self, guild: StandInGuild):
+        args = self.args
+        actions = (
+            ("add", args.add_rate),
+            ("remove", args.remove_rate),
+            ("volume", args.volume_rate),
+            ("churn", args.churn_rate),
+            ("chatter", args.chatter_rate),
+        )
+        names = [name for name, _ in actions]
+        weights = [rate for _, rate in actions]
+        total_rate = sum(weights) / 60
+
+        if not await self.wait(random.uniform(0, args.ramp_up)):
+            return
+        await self.join(guild)
+        while await self.wait(random.expovariate(total_rate)):
+            action = random.choices(names, weights)[0]
+            if guild.voice_client is None:
+                await self.join(guild)
+            elif action == "add":
+                self.add_source(guild)
+            elif action == "remove":
+                self.remove_source(guild)
+            elif action == "volume":
+                volume = round(random.uniform(0.5, 1.5), 2)
+                await self.dispatch(guild, f"master volume {volume}")
+            elif action == "churn":
+                await self.dispatch(guild, "leave")
+                await self.join(guild)
+            else:
+                await self.dispatch(guild, random.choice(CHATTER))
+
+    async def monitor_loop(self, interval: float = 0.05):
+        loop = asyncio.get_event_loop()
+        while not self.stopped.is_set():
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(0.0, loop.time() - start - interval))
+
+    async def report(self, start: float):
+        while await self.wait(self.args.report_interval):
+            sample = self.sample(start)
+            self.rss.append(sample)
+            print(
+                f"{sample['elapsed']:7.0f} s  "
+                f"voice clients {sample['voice_clients']:5d}  "
+                f"sources {sample['sources']:5d}  "
+                f"misses {sample['misses']:7d}  "
+                f"jitter p99 {sample['jitter_p99_ms']:6.2f} ms  "
+                f"loop lag max {sample['loop_lag_max_ms']:7.2f} ms  "
+                f"rss {sample['rss_mb']:7.1f} MB"
+            )
+
+    def sample(self, start: float) -> Dict[str, float]:
+        jitter = merge(stats.jitter for stats in self.stats)
+        return {
+            "elapsed": time.perf_counter() - start,
+            "voice_clients": sum(
+                guild.voice_client is not None for guild in self.guilds
+            ),
+            "sources": sum(len(guild.sources) for guild in self.guilds),
+            "misses": sum(stats.misses for stats in self.stats),
+            "jitter_p99_ms": quantile(jitter, 0.99) * 1000,
+            "loop_lag_max_ms": self.loop_lag.max * 1000,
+            "rss_mb": rss() / 2 ** 20,
+        }
+
+    async def wait(self, delay: float) -> bool:
+        """Sleep, unless stopped. Returns ``True``, if still running."""
+        try:
+            await asyncio.wait_for(self.stopped.wait(), delay)
+        except asyncio.TimeoutError:
+            return True
+        return False
+
+    async def run(self) -> Dict:
+        Harness.current = self
+        self.stopped = asyncio.Event()
+        start = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(self.drive(guild)) for guild in self.guilds
+        ]
+        monitors = [
+            asyncio.ensure_future(self.monitor_loop()),
+            asyncio.ensure_future(self.report(start)),
+        ]
+
+        await asyncio.sleep(self.args.duration)
+        self.stopped.set()
+        await asyncio.gather(*tasks, *monitors, return_exceptions=True)
+        #
+        # Everything should be finalized after the last leave.
+        for guild in self.guilds:
+            if guild.voice_client is not None:
+                await self.dispatch(guild, "leave")
+        await asyncio.sleep(1.0)
+        if self.state.engine is not None:
+            self.state.engine.stop()
+        return self.summary(start)
+
+    def summary(self, start: float) -> Dict:
+        jitter = merge(stats.jitter for stats in self.stats)
+        lateness = merge(stats.lateness for stats in self.stats)
+        packets = sum(stats.packets for stats in self.stats)
+        misses = sum(stats.misses for stats in self.stats)
+        # RSS growth is measured after all guilds have joined.
+        steady = [s for s in self.rss if s["elapsed"] >= self.args.ramp_up]
+        return {
+            "duration": time.perf_counter() - start,
+            "guilds": len(self.guilds),
+            "events": self.events,
+            "connects": len(self.stats),
+            "connect_failures": self.connect_failures,
+            "packets": packets,
+            "bad_frames": sum(stats.bad_frames for stats in self.stats),
+            "deadline_misses": misses,
+            "deadline_miss_rate": misses / packets if packets else 0.0,
+            "jitter_mean_ms": mean(jitter) * 1000,
+            "jitter_p99_ms": quantile(jitter, 0.99) * 1000,
+            "jitter_max_ms": jitter.max * 1000,
+            "lateness_p99_ms": quantile(lateness, 0.99) * 1000,
+            "lateness_max_ms": lateness.max * 1000,
+            "loop_lag_mean_ms": mean(self.loop_lag) * 1000,
+            "loop_lag_p99_ms": quantile(self.loop_lag, 0.99) * 1000,
+            "loop_lag_max_ms": self.loop_lag.max * 1000,
+            "rss_start_mb": steady[0]["rss_mb"] if steady else None,
+            "rss_end_mb": rss() / 2 ** 20,
+            "rss_growth_mb_per_min": slope(steady) * 60,
+            "sources_added": self.sources_added,
+            "sources_leaked": self.sources_added - self.sources_finalized,
+            "finalize_reasons": self.finalize_reasons,
+            "rss_samples": self.rss,
+            "jitter": jitter.as_dict(),
+            "lateness": lateness.as_dict(),
+            "loop_lag": self.loop_lag.as_dict(),
+        }
+
+
+def merge(histograms) -> Histogram:
+    result = Histogram(LAG_BUCKETS)
+    for histogram in histograms:
+        result.count += histogram.count
+        result.total += histogram.total
+        result.max = max(result.max, histogram.max)
+        for index, count in enumerate(histogram.counts):
+            result.counts[index] += count
+    return result
+
+
+def mean(histogram: Histogram) -> float:
+    return histogram.total / histogram.count if histogram.count else 0.0
+
+
+def quantile(histogram: Histogram, q: float) -> float:
+    """Upper bound of the bucket with the quantile."""
+    rank = q * histogram.count
+    seen = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        seen += count
+        if seen >= rank:
+            return min(bound, histogram.max)
+    return histogram.max
+
+
+def slope(samples: Sequence[Dict[str, float]]) -> float:
+    """Least squares slope of RSS in MB per second."""
+    if len(samples) < 2:
+        return 0.0
+    xs = [s["elapsed"] for s in samples]
+    ys = [s["rss_mb"] for s in samples]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    numerator = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    denominator = sum((x - x_mean) ** 2 for x in xs)
+    return numerator / denominator if denominator else 0.0
+
+
+def rss() -> int:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Soak test of the extension with fake guilds."
+    )
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument(
+        "--duration", type=float, default=300.0, help="Seconds to run"
+    )
+    parser.add_argument(
+        "--ramp-up",
+        type=float,
+        default=30.0,
+        help="Seconds, over which guilds join",
+    )
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Path to save results as JSON")
+
+    group = parser.add_argument_group("audio state")
+    group.add_argument(
+        "--engine-threads",
+        type=int,
+        default=None,
+        help="Use mixing engine instead of player thread per guild",
+    )
+    group.add_argument("--block-frames", type=int, default=1)
+    group.add_argument("--idle-timeout", type=float, default=1.0)
+    group.add_argument(
+        "--prefetch", type=int, default=None, help="Prefetch depth of sources"
+    )
+    group.add_argument("--connect-limit", type=int, default=4)
+    group.add_argument(
+        "--source-budget",
+        type=float,
+        default=None,
+        help="Milliseconds, that one read of source may take",
+    )
+
+    group = parser.add_argument_group("load, per guild")
+    group.add_argument(
+        "--add-rate", type=float, default=2.0, help="Sources per minute"
+    )
+    group.add_argument(
+        "--remove-rate", type=float, default=0.5, help="Removals per minute"
+    )
+    group.add_argument(
+        "--volume-rate",
+        type=float,
+        default=0.5,
+        help="Volume commands per minute",
+    )
+    group.add_argument(
+        "--churn-rate", type=float, default=0.1, help="Rejoins per minute"
+    )
+    group.add_argument(
+        "--chatter-rate",
+        type=float,
+        default=5.0,
+        help="Messages without commands per minute",
+    )
+    group.add_argument("--max-sources", type=int, default=4)
+    group.add_argument(
+        "--min-length", type=float, default=5.0, help="Seconds of source"
+    )
+    group.add_argument(
+        "--max-length", type=float, default=60.0, help="Seconds of source"
+    )
+    group.add_argument(
+        "--connect-latency",
+        type=float,
+        default=0.2,
+        help="Mean seconds per connect",
+    )
+    group.add_argument(
+        "--connect-failures",
+        type=float,
+        default=0.0,
+        help="Probability of connect timeout",
+    )
+    group.add_argument(
+        "--deadline",
+        type=float,
+        default=30.0,
+        help="Milliseconds between packets, counted as a miss",
+    )
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    loop = asyncio.get_event_loop()
+    summary = loop.run_until_complete(Harness(args).run())
+
+    for key, value in summary.items():
+        if not isinstance(value, (dict, list)):
+            print(f"{key:<24} {value}")
+
+    if args.output:
+        document = {
+            "version": version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "arguments": vars(args),
+            "summary": summary,
+        }
+        with open(args.output, "w") as file:
+            json.dump(document, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,10 +21,48 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
+from concord.ext.audio.broadcast import Broadcast, BroadcastSubscriber
+from concord.ext.audio.cache import (
+    CachedClip,
+    CachedClipSource,
+    CacheStatistics,
+    ClipCache,
+)
+from concord.ext.audio.connection import ConnectionManager
+from concord.ext.audio.engine import MixingEngine
 from concord.ext.audio.exceptions import AudioExtensionError
 from concord.ext.audio.extension import AudioExtension
-from concord.ext.audio.middleware import Join, Leave, Volume
-from concord.ext.audio.state import AudioStatus, AudioState, State
+from concord.ext.audio.formats import (
+    NATIVE_FORMAT,
+    AudioFormat,
+    ConvertingSource,
+    FormatConverter,
+    OpusDecodingSource,
+    conversion_plan,
+)
+from concord.ext.audio.metrics import (
+    AudioStateMetrics,
+    Histogram,
+    SourceMetrics,
+)
+from concord.ext.audio.middleware import AudioRouter, Join, Leave, Volume
+from concord.ext.audio.mixer import (
+    AudioopMixer,
+    Mixer,
+    NumpyMixer,
+    default_mixer,
+)
+from concord.ext.audio.prefetch import PrefetchSource
+from concord.ext.audio.process import (
+    DecoderPool,
+    ProcessSource,
+    SharedFrameRing,
+)
+from concord.ext.audio.queue import Track, TrackQueue
+from concord.ext.audio.shard import RemoteAudioState, ShardedState
+from concord.ext.audio.snapshot import ResumableSource
+from concord.ext.audio.state import AudioState, State
+from concord.ext.audio.status import AudioStatus, PlayerStatus
 from concord.ext.audio.version import version
 
 
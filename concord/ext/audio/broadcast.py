@@ -0,0 +1,257 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import discord
+
+from concord.ext.audio.buffer import FrameBuffer
+from concord.ext.audio.constants import SILENCE
+from concord.ext.audio.formats import OpusDecodingSource
+
+
+log = logging.getLogger(__name__)
+
+
+class Broadcast:
+    """Audio source, that is decoded once and played by many audio states.
+
+    Each frame is read from the original audio source only once and kept in
+    the ring of the last ``depth`` frames. Frames are immutable
+    :class:`bytes`, so they are shared by all subscribers without copying.
+
+    Original audio source is read by the background thread, which stays up to
+    ``lead`` frames ahead of the most advanced subscriber, so subscribers only
+    read from the ring and never block the player threads. If there is no
+    frame ready yet, subscriber returns silence instead.
+
+    Subscribers are audio sources with their own cursors (see
+    :meth:`subscribe`), which can be added to any amount of audio states.
+    Late subscribers start from the live frame, which is the next frame of the
+    most advanced subscriber. Subscribers, that are lagging more than
+    ``depth`` frames, skip to the oldest frame in the ring.
+
+    .. note::
+        Thread is stopped only when original source ends, or when
+        :meth:`close` is called. Do not forget to call it, if broadcast is
+        not needed anymore.
+
+    Args:
+        source: Audio source to broadcast. Opus audio sources are decoded.
+        depth: Amount of the last frames to keep for lagging subscribers.
+        lead: Maximum amount of frames to decode ahead. It is limited by
+            ``depth``.
+
+    Attributes:
+        source: Audio source to broadcast.
+        depth: Amount of the last frames to keep.
+        lead: Maximum amount of frames to decode ahead.
+        _reader: Audio source to read PCM from.
+        _frames: Ring of frames with their sequence numbers.
+        _head: Sequence number of the next frame.
+        _demand: Sequence number of the live frame.
+        _is_ended: Is original audio source has ended.
+        _is_closed: Is broadcast has been closed.
+        _condition: Condition for waiting for the demand.
+        _thread: Background thread.
+    """
+
+    source: discord.AudioSource
+    depth: int
+    lead: int
+
+    _reader: discord.AudioSource
+    _frames: List[Optional[Tuple[int, bytes]]]
+    _head: int
+    _demand: int
+    _is_ended: bool
+    _is_closed: bool
+    _condition: threading.Condition
+    _thread: threading.Thread
+
+    def __init__(
+        self, source: discord.AudioSource, *, depth: int = 50, lead: int = 10
+    ):
+        if not isinstance(source, discord.AudioSource):
+            raise ValueError("Not an audio source")
+        if depth < 1:
+            raise ValueError("Depth should be positive")
+        if lead < 1:
+            raise ValueError("Lead should be positive")
+
+        self.source = source
+        self.depth = depth
+        self.lead = min(lead, depth)
+        self._reader = (
+            OpusDecodingSource(source) if source.is_opus() else source
+        )
+        self._frames = [None] * depth
+        self._head = 0
+        self._demand = 0
+        self._is_ended = False
+        self._is_closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name=f"broadcast-{id(self):x}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def frames(self) -> int:
+        """Amount of decoded frames."""
+        return self._head
+
+    @property
+    def is_ended(self) -> bool:
+        """Is broadcast has ended."""
+        return self._is_ended or self._is_closed
+
+    def subscribe(self) -> "BroadcastSubscriber":
+        """Returns new subscriber, that starts from the live frame."""
+        return BroadcastSubscriber(self)
+
+    def close(self):
+        """End the broadcast and clean up the original audio source.
+
+        Subscribers end after the frames, that are already decoded.
+        """
+        with self._condition:
+            if self._is_closed:
+                return
+            self._is_closed = True
+            is_running = not self._is_ended
+            self._condition.notify()
+        # Otherwise source is cleaned up by the thread after the current read.
+        if not is_running:
+            self.source.cleanup()
+
+    def _run(self):
+        buffer = FrameBuffer()
+
+        try:
+            while True:
+                with self._condition:
+                    while (
+                        self._head - self._demand >= self.lead
+                        and not self._is_closed
+                    ):
+                        self._condition.wait()
+                    if self._is_closed:
+                        break
+
+                frame = buffer.pull(self._reader)
+                if frame is None:
+                    break
+                self._frames[self._head % self.depth] = (
+                    self._head,
+                    bytes(frame),
+                )
+                self._head += 1
+        except Exception:
+            log.exception("Exception while reading broadcast")
+        finally:
+            with self._condition:
+                self._is_ended = True
+                is_closed = self._is_closed
+            if is_closed:
+                self.source.cleanup()
+
+    def _request(self, sequence: int):
+        # Only the most advanced subscriber wakes up the thread.
+        if sequence <= self._demand:
+            return
+        with self._condition:
+            if sequence > self._demand:
+                self._demand = sequence
+                self._condition.notify()
+
+    def _get(self, sequence: int) -> Optional[bytes]:
+        slot = self._frames[sequence % self.depth]
+        if slot is None or slot[0] != sequence:
+            return None
+        return slot[1]
+
+
+class BroadcastSubscriber(discord.AudioSource):
+    """Audio source, that plays the broadcast from its own cursor.
+
+    Returned frames are shared with other subscribers and should not be
+    modified.
+
+    Args:
+        broadcast: Broadcast to play.
+
+    Attributes:
+        broadcast: Broadcast to play.
+        dropped: Amount of frames, skipped due to lagging.
+        underruns: Amount of reads, when there was no frame ready.
+        _cursor: Sequence number of the next frame to play.
+    """
+
+    broadcast: Broadcast
+    dropped: int
+    underruns: int
+
+    _cursor: int
+
+    def __init__(self, broadcast: Broadcast):
+        self.broadcast = broadcast
+        self.dropped = 0
+        self.underruns = 0
+        self._cursor = broadcast._demand
+
+    @property
+    def lag(self) -> int:
+        """Amount of decoded frames, that are not played yet."""
+        return max(0, self.broadcast._head - self._cursor)
+
+    def read(self) -> bytes:  # noqa: D102
+        broadcast = self.broadcast
+
+        while True:
+            cursor = self._cursor
+            head = broadcast._head
+            oldest = head - broadcast.depth
+            if cursor < oldest:
+                self.dropped += oldest - cursor
+                cursor = oldest
+            if cursor >= head:
+                # Frame can be decoded right after the first check.
+                if broadcast._is_ended and cursor >= broadcast._head:
+                    return b""
+                if broadcast._is_closed:
+                    return b""
+                broadcast._request(cursor)
+                self.underruns += 1
+                return SILENCE
+
+            frame = broadcast._get(cursor)
+            if frame is not None:
+                self._cursor = cursor + 1
+                broadcast._request(cursor + 1)
+                return frame
+            # Frame has been overwritten right now, so skip to the oldest one.
+            self._cursor = cursor + 1
+            self.dropped += 1
@@ -0,0 +1,223 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+from typing import Any, Dict, Optional, Tuple, Union
+
+import discord
+
+from concord.ext.audio.constants import FRAME_SIZE
+
+
+class FrameBuffer:
+    """Carry-over buffer, that assembles fixed-size frames from audio source.
+
+    Audio sources are allowed to return fragments of any size, but the mixer
+    should produce exactly one full frame each time. Bytes, which are left
+    after the frame is filled, are kept as a memory view of the source's
+    fragment and used first on the next pull, so nothing is thrown away.
+
+    If audio source returns exactly one frame, it is passed as is. Otherwise,
+    frame is assembled in the preallocated buffer, which is reused between
+    pulls, so returned frame is valid only until the next pull.
+
+    Args:
+        frame_size: Size of the frame in bytes.
+        pad: Should the last frame be filled with silence, if source ends in
+            the middle of it. Otherwise, the last frame is returned shorter.
+
+    Attributes:
+        short_fragments: Amount of fragments shorter than a frame.
+        _frame_size: Size of the frame in bytes.
+        _pad: Should the last frame be filled with silence.
+        _frame: Preallocated frame buffer.
+        _remainder: Bytes left from the last read fragment.
+        _is_ended: Is source has returned an empty fragment.
+    """
+
+    __slots__ = (
+        "short_fragments",
+        "_frame_size",
+        "_pad",
+        "_frame",
+        "_remainder",
+        "_is_ended",
+    )
+
+    short_fragments: int
+    _frame_size: int
+    _pad: bool
+    _frame: memoryview
+    _remainder: memoryview
+    _is_ended: bool
+
+    def __init__(self, frame_size: int = FRAME_SIZE, *, pad: bool = True):
+        self.short_fragments = 0
+        self._frame_size = frame_size
+        self._pad = pad
+        self._frame = memoryview(bytearray(frame_size))
+        self._remainder = memoryview(b"")
+        self._is_ended = False
+
+    @property
+    def is_empty(self) -> bool:
+        """Is there no bytes left from the previous pulls."""
+        return len(self._remainder) == 0
+
+    @property
+    def is_ended(self) -> bool:
+        """Is source has ended."""
+        return self._is_ended
+
+    def pull(
+        self, source: discord.AudioSource
+    ) -> Optional[Union[bytes, memoryview]]:
+        """Pull one frame from the audio source.
+
+        If source ends in the middle of the frame, the rest of the frame is
+        filled with silence, unless padding is disabled.
+
+        Args:
+            source: Audio source to read fragments from.
+
+        Returns:
+            The full frame, or ``None``, if source has ended and there is
+            nothing left to return.
+        """
+        size = self._frame_size
+        remainder = self._remainder
+
+        if len(remainder) >= size:
+            self._remainder = remainder[size:]
+            return remainder[:size]
+        if len(remainder) == 0:
+            if self._is_ended:
+                return None
+
+            fragment = source.read()
+            if len(fragment) == size:
+                return fragment
+            if len(fragment) > size:
+                view = memoryview(fragment)
+                self._remainder = view[size:]
+                return view[:size]
+            if len(fragment) == 0:
+                self._is_ended = True
+                return None
+            self.short_fragments += 1
+            remainder = memoryview(fragment)
+        #
+        # Assembling frame from several fragments.
+        frame = self._frame
+        filled = len(remainder)
+        frame[:filled] = remainder
+        remainder = remainder[filled:]
+
+        while filled < size:
+            fragment = source.read()
+            if len(fragment) == 0:
+                self._is_ended = True
+                if not self._pad:
+                    self._remainder = remainder
+                    return frame[:filled]
+                frame[filled:] = bytes(size - filled)
+                break
+
+            view = memoryview(fragment)
+            if len(view) < size:
+                self.short_fragments += 1
+            taken = min(len(view), size - filled)
+            frame[filled : filled + taken] = view[:taken]
+            filled += taken
+            remainder = view[taken:]
+
+        self._remainder = remainder
+        return frame
+
+
+class MixBlock:
+    """Block of several mixed frames, that are served one by one.
+
+    Block keeps the raw frames of each audio source, which were pulled for the
+    block, so the rest of the block can be mixed again, if audio sources or
+    volumes are changed in the middle of it.
+
+    Args:
+        frames: Amount of frames in the block.
+        frame_size: Size of the frame in bytes.
+
+    Attributes:
+        frames: Amount of frames in the block.
+        frame_size: Size of the frame in bytes.
+        data: Mixed frames from the ``offset`` to the ``length``.
+        offset: Index of the first frame in the ``data``.
+        index: Index of the next frame to serve.
+        length: Amount of frames, pulled for the block.
+        key: Counter of registry changes, the block was mixed with.
+        raw: Raw frames of the whole block and the index of the frame, where
+            audio source has ended, if any, by the source entry.
+    """
+
+    __slots__ = (
+        "frames",
+        "frame_size",
+        "data",
+        "offset",
+        "index",
+        "length",
+        "key",
+        "raw",
+    )
+
+    frames: int
+    frame_size: int
+    data: bytes
+    offset: int
+    index: int
+    length: int
+    key: Optional[int]
+    raw: Dict[Any, Tuple[memoryview, Optional[int]]]
+
+    def __init__(self, frames: int, frame_size: int = FRAME_SIZE):
+        self.frames = frames
+        self.frame_size = frame_size
+        self.reset()
+
+    @property
+    def is_exhausted(self) -> bool:
+        """Is all pulled frames have been served."""
+        return self.index >= self.length
+
+    def reset(self):
+        """Drop the rest of the block."""
+        self.data = b""
+        self.offset = 0
+        self.index = 0
+        self.length = 0
+        self.key = None
+        self.raw = {}
+
+    def next_frame(self) -> bytes:
+        """Returns the next mixed frame."""
+        start = (self.index - self.offset) * self.frame_size
+        self.index += 1
+        return self.data[start : start + self.frame_size]
@@ -0,0 +1,476 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import discord
+
+from concord.ext.audio.constants import FRAME_SIZE
+
+
+log = logging.getLogger(__name__)
+
+_PREFIX = "concord-clip-"
+#: Names of clip files and of temporary files, that are being written.
+_NAME = re.compile(rf"{_PREFIX}(?:[0-9a-f]{{40}}\.pcm|\w+\.tmp)")
+
+
+class CacheStatistics:
+    """Statistics of the clip cache.
+
+    Attributes:
+        hits: Amount of lookups, that have found the clip.
+        memory_hits: Amount of lookups, that have found the clip in memory.
+        disk_hits: Amount of lookups, that have found the clip on disk.
+        misses: Amount of lookups, that have not found the clip.
+        evictions: Amount of clips, evicted from memory.
+        disk_evictions: Amount of clips, evicted from disk.
+    """
+
+    __slots__ = (
+        "hits",
+        "memory_hits",
+        "disk_hits",
+        "misses",
+        "evictions",
+        "disk_evictions",
+    )
+
+    hits: int
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    evictions: int
+    disk_evictions: int
+
+    def __init__(self):
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        """Returns statistics as a dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CachedClip:
+    """Decoded PCM clip.
+
+    Args:
+        data: Decoded PCM, or memory-mapped file with it.
+
+    Attributes:
+        data: Decoded PCM, or memory-mapped file with it.
+        view: Read-only memory view of the data.
+    """
+
+    __slots__ = ("data", "view")
+
+    data: Union[bytes, mmap.mmap]
+    view: memoryview
+
+    def __init__(self, data: Union[bytes, mmap.mmap]):
+        self.data = data
+        self.view = memoryview(data)
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    @property
+    def is_mapped(self) -> bool:
+        """Is clip is backed by memory-mapped file."""
+        return isinstance(self.data, mmap.mmap)
+
+    def source(self) -> "CachedClipSource":
+        """Returns new audio source, that plays the clip."""
+        return CachedClipSource(self)
+
+
+class CachedClipSource(discord.AudioSource):
+    """Audio source, that plays cached clip.
+
+    Frames are returned as memory views of the clip, without copying.
+
+    .. note::
+        Since frames are not :class:`bytes`, this source is intended to be
+        added to :class:`AudioState` rather than played by voice client
+        directly.
+
+    Args:
+        clip: Clip to play.
+
+    Attributes:
+        clip: Clip to play.
+        position: Position of the next frame in bytes.
+    """
+
+    clip: CachedClip
+    position: int
+
+    def __init__(self, clip: CachedClip):
+        self.clip = clip
+        self.position = 0
+
+    def read(self) -> memoryview:  # noqa: D102
+        position = self.position
+        self.position += FRAME_SIZE
+        return self.clip.view[position : position + FRAME_SIZE]
+
+
+class ClipCache:
+    """Cache of decoded audio clips.
+
+    Clips are stored as decoded PCM, so playing the same clip again doesn't
+    require decoding it. Cache has two tiers:
+
+    * memory tier, which is LRU bounded by the total size of clips;
+    * optional disk tier, which is used for clips evicted from memory. Clips
+      are stored in files and memory-mapped on access, also bounded by the
+      total size with LRU eviction.
+
+    Clips are identified by the key, provided by the user, like file path or
+    URL of the original audio.
+
+    Cache is thread safe. Clips, that are being loaded, are decoded only once,
+    and other threads wait for them.
+
+    Clips are written to disk without holding the lock, so lookups don't
+    wait for disk I/O.
+
+    Clip files, that are left in the directory by previous processes, are
+    removed on creation, since their keys can't be recovered. Only files,
+    named by the cache, are removed, but directory should not be shared by
+    several caches at once.
+
+    Args:
+        max_memory: Maximum total size of clips in memory, in bytes.
+        directory: Directory for the disk tier. If not provided, disk tier is
+            not used.
+        max_disk: Maximum total size of clips on disk, in bytes. If not
+            provided, size is not limited.
+
+    Attributes:
+        statistics: Statistics of the cache.
+        _max_memory: Maximum total size of clips in memory, in bytes.
+        _max_disk: Maximum total size of clips on disk, in bytes.
+        _directory: Directory for the disk tier.
+        _memory: Clips in memory.
+        _memory_size: Total size of clips in memory.
+        _disk: Memory-mapped clips on disk.
+        _disk_size: Total size of clips on disk.
+        _storing: Clips, evicted from memory, that are being written to disk.
+        _loading: Futures of clips, that are being loaded, by the key.
+        _lock: Lock for serializing access.
+    """
+
+    statistics: CacheStatistics
+
+    _max_memory: int
+    _max_disk: Optional[int]
+    _directory: Optional[str]
+    _memory: Dict[Hashable, CachedClip]
+    _memory_size: int
+    _disk: Dict[Hashable, CachedClip]
+    _disk_size: int
+    _storing: Dict[Hashable, CachedClip]
+    _loading: Dict[Hashable, concurrent.futures.Future]
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        *,
+        max_memory: int = 64 * 1024 * 1024,
+        directory: Optional[str] = None,
+        max_disk: Optional[int] = None,
+    ):
+        self.statistics = CacheStatistics()
+
+        self._max_memory = max_memory
+        self._max_disk = max_disk
+        self._directory = directory
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._disk = collections.OrderedDict()
+        self._disk_size = 0
+        self._storing = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._purge()
+
+    def __len__(self) -> int:
+        return len(self._memory) + len(self._storing) + len(self._disk)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._memory or key in self._storing or key in self._disk
+
+    @property
+    def memory_size(self) -> int:
+        """Total size of clips in memory."""
+        return self._memory_size
+
+    @property
+    def disk_size(self) -> int:
+        """Total size of clips on disk."""
+        return self._disk_size
+
+    def get(self, key: Hashable) -> Optional[CachedClip]:
+        """Returns cached clip.
+
+        Args:
+            key: Key of the clip.
+
+        Returns:
+            Cached clip, or ``None``, if clip is not cached.
+        """
+        with self._lock:
+            clip = self._memory.get(key)
+            if clip is not None:
+                self._memory.move_to_end(key)
+                self.statistics.hits += 1
+                self.statistics.memory_hits += 1
+                return clip
+            # Clip is still in memory, while it is being written to disk.
+            clip = self._storing.get(key)
+            if clip is not None:
+                self.statistics.hits += 1
+                self.statistics.memory_hits += 1
+                return clip
+
+            clip = self._disk.get(key)
+            if clip is not None:
+                self._disk.move_to_end(key)
+                self.statistics.hits += 1
+                self.statistics.disk_hits += 1
+                return clip
+
+            self.statistics.misses += 1
+            return None
+
+    def put(self, key: Hashable, data: bytes) -> CachedClip:
+        """Put decoded clip into the cache.
+
+        If clip with the same key is cached, it will be replaced.
+
+        Args:
+            key: Key of the clip.
+            data: Decoded PCM.
+
+        Returns:
+            Cached clip.
+        """
+        clip = CachedClip(bytes(data))
+        evicted: List[Tuple[Hashable, CachedClip]] = []
+
+        with self._lock:
+            self._discard(key)
+            self._memory[key] = clip
+            self._memory_size += len(clip)
+
+            while self._memory_size > self._max_memory:
+                evicted_key, evicted_clip = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted_clip)
+                self.statistics.evictions += 1
+                if self._is_storable(evicted_clip):
+                    self._storing[evicted_key] = evicted_clip
+                    evicted.append((evicted_key, evicted_clip))
+
+        for evicted_key, evicted_clip in evicted:
+            self._store(evicted_key, evicted_clip)
+        return clip
+
+    def load(
+        self, key: Hashable, factory: Callable[[], discord.AudioSource]
+    ) -> CachedClip:
+        """Returns cached clip, decoding it, if needed.
+
+        .. warning::
+            Audio source is read till the end in the calling thread, so it
+            should be used for short clips, or called in executor.
+
+        Args:
+            key: Key of the clip.
+            factory: Callable, that returns audio source with the clip, if it
+                is not cached. Audio source should produce PCM.
+
+        Returns:
+            Cached clip.
+        """
+        clip = self.get(key)
+        if clip is not None:
+            return clip
+
+        with self._lock:
+            # Clip could be loaded by another thread right before.
+            clip = (
+                self._memory.get(key)
+                or self._storing.get(key)
+                or self._disk.get(key)
+            )
+            if clip is not None:
+                return clip
+            future = self._loading.get(key)
+            is_loading = future is not None
+            if not is_loading:
+                future = self._loading[key] = concurrent.futures.Future()
+        if is_loading:
+            return future.result()
+
+        try:
+            clip = self.put(key, self._decode(factory))
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(clip)
+            return clip
+        finally:
+            with self._lock:
+                del self._loading[key]
+
+    def _decode(self, factory: Callable[[], discord.AudioSource]) -> bytes:
+        source = factory()
+        if source.is_opus():
+            raise ValueError("Opus audio sources are not supported")
+
+        fragments = []
+        try:
+            while True:
+                fragment = source.read()
+                if len(fragment) == 0:
+                    break
+                fragments.append(fragment)
+        finally:
+            source.cleanup()
+        return b"".join(fragments)
+
+    def source(
+        self, key: Hashable, factory: Callable[[], discord.AudioSource]
+    ) -> CachedClipSource:
+        """Returns audio source, that plays cached clip.
+
+        Clip is decoded and cached, if needed. See :meth:`load` for details.
+        """
+        return CachedClipSource(self.load(key, factory))
+
+    def clear(self):
+        """Remove all clips from the cache."""
+        with self._lock:
+            keys = list(self._memory) + list(self._storing) + list(self._disk)
+            for key in keys:
+                self._discard(key)
+
+    def _purge(self):
+        for name in os.listdir(self._directory):
+            if _NAME.fullmatch(name) is None:
+                continue
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                log.warning("Unable to remove stale cached clip from disk")
+
+    def _path(self, key: Hashable) -> str:
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self._directory, f"{_PREFIX}{name}.pcm")
+
+    def _discard(self, key: Hashable):
+        clip = self._memory.pop(key, None)
+        if clip is not None:
+            self._memory_size -= len(clip)
+
+        # Clip, that is being written, is dropped, when writing is finished.
+        self._storing.pop(key, None)
+
+        clip = self._disk.pop(key, None)
+        if clip is not None:
+            self._disk_size -= len(clip)
+            self._unlink(key)
+
+    def _is_storable(self, clip: CachedClip) -> bool:
+        if self._directory is None or len(clip) == 0:
+            return False
+        return self._max_disk is None or len(clip) <= self._max_disk
+
+    def _store(self, key: Hashable, clip: CachedClip):
+        # Called without the lock, only the index is updated under it.
+        temporary = None
+        try:
+            descriptor, temporary = tempfile.mkstemp(
+                suffix=".tmp", prefix=_PREFIX, dir=self._directory
+            )
+            with open(descriptor, "wb") as file:
+                file.write(clip.view)
+            with open(temporary, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            log.exception("Unable to store clip on disk")
+            data = None
+
+        with self._lock:
+            # Clip could be replaced or removed, while it was being written.
+            if data is not None and self._storing.get(key) is clip:
+                try:
+                    os.replace(temporary, self._path(key))
+                except OSError:
+                    log.exception("Unable to store clip on disk")
+                else:
+                    temporary = None
+                    self._disk[key] = CachedClip(data)
+                    self._disk_size += len(clip)
+            if self._storing.get(key) is clip:
+                del self._storing[key]
+
+            while (
+                self._max_disk is not None and self._disk_size > self._max_disk
+            ):
+                evicted_key, evicted_clip = self._disk.popitem(last=False)
+                self._disk_size -= len(evicted_clip)
+                self.statistics.disk_evictions += 1
+                self._unlink(evicted_key)
+
+        if temporary is not None:
+            try:
+                os.remove(temporary)
+            except OSError:
+                log.warning("Unable to remove temporary clip from disk")
+
+    def _unlink(self, key: Hashable):
+        # Mapped memory stays valid for sources, that are still playing.
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            log.warning("Unable to remove cached clip from disk")
@@ -0,0 +1,181 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+import random
+from typing import Dict, Optional, Tuple, Type
+
+import discord
+
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """Manager of voice connections.
+
+    Voice handshakes are expensive, so when many guilds are connecting at
+    once (like after resuming the gateway session), they can time out all
+    together. Manager limits amount of simultaneous connects, retries failed
+    ones with the jittered exponential backoff and coalesces requests for the
+    same voice client key into a single connect. Voice client, left by the
+    failed attempt, is disconnected before the retry.
+
+    Args:
+        limit: Maximum amount of simultaneous connects.
+        retries: Amount of retries after the first failed attempt.
+        backoff: Base delay in seconds before the retry. It's doubled after
+            each failed attempt.
+        max_backoff: Maximum delay in seconds before the retry.
+        timeout: Timeout in seconds of each attempt.
+        errors: Exceptions, after which connect is retried.
+
+    Attributes:
+        limit: Maximum amount of simultaneous connects.
+        retries: Amount of retries after the first failed attempt.
+        backoff: Base delay in seconds before the retry.
+        max_backoff: Maximum delay in seconds before the retry.
+        timeout: Timeout in seconds of each attempt.
+        errors: Exceptions, after which connect is retried.
+        _semaphore: Semaphore for limiting simultaneous connects. It is
+            created on first use, so it's bound to the running loop.
+        _pending: In-flight connects by voice client key ID.
+    """
+
+    limit: int
+    retries: int
+    backoff: float
+    max_backoff: float
+    timeout: float
+    errors: Tuple[Type[BaseException], ...]
+
+    _semaphore: Optional[asyncio.Semaphore]
+    _pending: Dict[int, asyncio.Future]
+
+    def __init__(
+        self,
+        *,
+        limit: int = 4,
+        retries: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        timeout: float = 60.0,
+        errors: Tuple[Type[BaseException], ...] = (
+            asyncio.TimeoutError,
+            discord.ConnectionClosed,
+            OSError,
+        ),
+    ):
+        if limit < 1:
+            raise ValueError("Limit should be positive")
+
+        self.limit = limit
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.errors = errors
+        self._semaphore = None
+        self._pending = {}
+
+    @property
+    def in_flight(self) -> int:
+        """Amount of voice client keys, that are connecting now."""
+        return len(self._pending)
+
+    async def connect(
+        self, channel: discord.abc.Connectable
+    ) -> discord.VoiceClient:
+        """Connect to the voice channel.
+
+        If connect for the same voice client key is already in-flight, its
+        result is returned instead, so voice client can be connected to
+        another channel with the same key.
+
+        Args:
+            channel: Channel to connect to.
+
+        Returns:
+            Connected voice client.
+
+        Raises:
+            asyncio.TimeoutError: If all attempts have timed out.
+            Exception: Other exception of the last attempt.
+        """
+        key_id, _ = channel._get_voice_client_key()
+        task = self._pending.get(key_id)
+
+        if task is None:
+            task = self._pending[key_id] = asyncio.ensure_future(
+                self._connect(channel)
+            )
+            task.add_done_callback(
+                lambda task: self._on_connected(key_id, task)
+            )
+        # Cancelling of one waiter shouldn't cancel the others.
+        return await asyncio.shield(task)
+
+    def _on_connected(self, key_id: int, task: asyncio.Future):
+        if self._pending.get(key_id) is task:
+            del self._pending[key_id]
+        # Exception is retrieved, so it isn't logged, if nobody waits for it.
+        if not task.cancelled():
+            task.exception()
+
+    async def _connect(
+        self, channel: discord.abc.Connectable
+    ) -> discord.VoiceClient:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    return await channel.connect(timeout=self.timeout)
+            except self.errors as exception:
+                if attempt >= self.retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                # Jitter spreads the retries of connects failed together.
+                delay *= random.uniform(0.5, 1.5)
+                attempt += 1
+                log.warning(
+                    f"Voice connect has failed, retrying in {delay:.1f}s "
+                    f"({exception!r})"
+                )
+            await self._remove_stale(channel)
+            await asyncio.sleep(delay)
+
+    async def _remove_stale(self, channel: discord.abc.Connectable):
+        # Voice client is removed by discord.py only after timeout, so
+        # otherwise the retry fails with "Already connected".
+        guild = getattr(channel, "guild", None)
+        voice_client = guild.voice_client if guild is not None else None
+        if voice_client is None or voice_client.is_connected():
+            return
+        try:
+            await voice_client.disconnect(force=True)
+        except Exception:
+            log.exception("Unable to remove voice client of failed connect")
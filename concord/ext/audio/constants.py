@@ -0,0 +1,34 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import discord.opus
+
+
+SAMPLING_RATE = discord.opus.Encoder.SAMPLING_RATE
+CHANNELS = discord.opus.Encoder.CHANNELS
+FRAME_LENGTH = discord.opus.Encoder.FRAME_LENGTH  # in milliseconds
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE  # in bytes
+
+SILENCE = bytes(FRAME_SIZE)
+OPUS_SILENCE = b"\xf8\xff\xfe"
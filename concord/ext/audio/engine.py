@@ -0,0 +1,241 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import discord
+
+from concord.ext.audio.constants import FRAME_LENGTH
+
+if TYPE_CHECKING:  # pragma: no cover
+    from concord.ext.audio.state import AudioState
+
+
+log = logging.getLogger(__name__)
+
+
+def _speak(voice_client: discord.VoiceClient, speaking: bool):
+    try:
+        asyncio.run_coroutine_threadsafe(
+            voice_client.ws.speak(speaking), voice_client.loop
+        )
+    except Exception as exc:
+        log.info(f"Speaking call in mixing engine failed: {exc}")
+
+
+class MixingEngine:
+    """Shared mixing scheduler for audio states.
+
+    Instead of starting one player thread per voice client, audio states are
+    distributed over the small fixed pool of mixing threads. All threads tick
+    on the shared clock with the frame length interval, read the next frame
+    from each of their audio states and send it to the voice client.
+
+    Threads are started lazily, on the first audio state attach.
+
+    Args:
+        threads: Amount of mixing threads.
+
+    Attributes:
+        DELAY: Interval between ticks, in seconds.
+        _workers: Mixing threads.
+        _assignments: Mixing thread for each attached audio state.
+        _lock: Lock for serializing attaching and detaching.
+        _clock: Start time of the shared clock.
+        _is_started: Are mixing threads started.
+        _is_stopped: Is engine has been stopped.
+    """
+
+    DELAY = FRAME_LENGTH / 1000.0
+
+    _workers: List["_Worker"]
+    _assignments: Dict["AudioState", "_Worker"]
+    _lock: threading.Lock
+    _clock: float
+    _is_started: bool
+    _is_stopped: bool
+
+    def __init__(self, *, threads: int = 2):
+        if threads < 1:
+            raise ValueError("Amount of threads should be positive")
+
+        self._workers = [_Worker(self, index) for index in range(threads)]
+        self._assignments = {}
+        self._lock = threading.Lock()
+        self._clock = 0.0
+        self._is_started = False
+        self._is_stopped = False
+
+    @property
+    def threads(self) -> int:
+        """Amount of mixing threads."""
+        return len(self._workers)
+
+    def __len__(self) -> int:
+        return len(self._assignments)
+
+    def is_attached(self, audio_state: "AudioState") -> bool:
+        """Is audio state ticked by the engine."""
+        return audio_state in self._assignments
+
+    def attach(self, audio_state: "AudioState"):
+        """Start ticking audio state.
+
+        Audio state is assigned to the least loaded mixing thread. If audio
+        state is already attached, does nothing.
+
+        Args:
+            audio_state: Audio state to tick. It should have voice client.
+
+        Raises:
+            RuntimeError: If engine has been stopped.
+        """
+        with self._lock:
+            if self._is_stopped:
+                raise RuntimeError("Mixing engine is stopped")
+            if audio_state in self._assignments:
+                return
+            if not self._is_started:
+                self._start()
+
+            worker = min(self._workers, key=lambda w: len(w.states))
+            self._assignments[audio_state] = worker
+            worker.states = worker.states + (audio_state,)
+            worker.wakeup.set()
+
+        _speak(audio_state.voice_client, True)
+
+    def detach(self, audio_state: "AudioState"):
+        """Stop ticking audio state.
+
+        If audio state is not attached, does nothing.
+
+        Args:
+            audio_state: Audio state to stop ticking.
+        """
+        with self._lock:
+            worker = self._assignments.pop(audio_state, None)
+            if worker is None:
+                return
+            worker.states = tuple(
+                s for s in worker.states if s is not audio_state
+            )
+
+        if audio_state.voice_client is not None:
+            _speak(audio_state.voice_client, False)
+
+    def stop(self):
+        """Stop all mixing threads.
+
+        All attached audio states are detached. Engine can't be started again.
+        """
+        with self._lock:
+            self._is_stopped = True
+            audio_states = list(self._assignments)
+
+        for audio_state in audio_states:
+            self.detach(audio_state)
+        for worker in self._workers:
+            worker.wakeup.set()
+
+    def _start(self):
+        self._clock = time.perf_counter()
+        self._is_started = True
+
+        for worker in self._workers:
+            worker.start()
+
+    def _finish(self, audio_state: "AudioState"):
+        # Same as player does, when source has ended.
+        self.detach(audio_state)
+        try:
+            audio_state.cleanup()
+        except Exception:
+            log.exception("Exception while cleaning up audio state")
+
+
+class _Worker(threading.Thread):
+    """Mixing thread of the engine.
+
+    Attributes:
+        states: Audio states, ticked by this thread. Tuple is replaced on each
+            modification, so it can be iterated without locking.
+        wakeup: Event for waking up the thread, when it has nothing to tick.
+    """
+
+    states: Tuple["AudioState", ...]
+    wakeup: threading.Event
+
+    _engine: MixingEngine
+
+    def __init__(self, engine: MixingEngine, index: int):
+        super().__init__(name=f"mixing-engine-{index}", daemon=True)
+        self.states = ()
+        self.wakeup = threading.Event()
+        self._engine = engine
+
+    def run(self):
+        engine = self._engine
+        delay = engine.DELAY
+
+        while not engine._is_stopped:
+            states = self.states
+            if len(states) == 0:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            for audio_state in states:
+                self._tick(audio_state)
+            #
+            # Sleeping until the next tick of the shared clock. If we are
+            # late, missed ticks are skipped.
+            now = time.perf_counter()
+            elapsed = now - engine._clock
+            time.sleep(delay * (elapsed // delay + 1) - elapsed)
+
+    def _tick(self, audio_state: "AudioState"):
+        voice_client = audio_state.voice_client
+        if voice_client is None or not voice_client.is_connected():
+            return
+
+        try:
+            data = audio_state.read()
+        except Exception:
+            log.exception("Exception while reading audio state")
+            data = b""
+
+        if not data:
+            self._engine._finish(audio_state)
+            return
+
+        try:
+            voice_client.send_audio_packet(
+                data, encode=not audio_state.is_opus()
+            )
+        except Exception:
+            log.exception("Exception while sending audio packet")
@@ -27,20 +27,13 @@ from concord.constants import EventType
 from concord.ext.base import (
     BotFilter,
     ChannelTypeFilter,
-    Command,
     EventNormalization,
     EventTypeFilter,
 )
 from concord.extension import Extension
-from concord.middleware import (
-    Middleware,
-    MiddlewareState,
-    OneOfAll,
-    chain_of,
-    collection_of,
-)
+from concord.middleware import Middleware, MiddlewareState, chain_of
 
-from concord.ext.audio.middleware import Join, Leave, Volume
+from concord.ext.audio.middleware import AudioRouter, Join, Leave, Volume
 from concord.ext.audio.state import State
 from concord.ext.audio.version import version
 
@@ -55,44 +48,34 @@ class AudioExtension(Extension):
 
         self._state = State()
         self._client_middleware = [MiddlewareState(self._state)]
+
+        self._router = AudioRouter()
+        self._router.register(Join(), "join", "connect")
+        self._router.register(Leave(), "leave", "disconnect")
+        self._router.register(
+            Volume(), "master volume", rest_pattern="(?P<volume>.+)?"
+        )
+        # Common filters are run once for all audio commands.
         self._extension_middleware = [
             chain_of(
                 [
-                    Join(),
-                    collection_of(
-                        OneOfAll, [Command("join"), Command("connect")]
-                    ),
-                    ChannelTypeFilter(guild=True),
-                    BotFilter(authored_by_bot=False),
-                    EventTypeFilter(EventType.MESSAGE),
-                    EventNormalization(),
-                ]
-            ),
-            chain_of(
-                [
-                    Leave(),
-                    collection_of(
-                        OneOfAll, [Command("leave"), Command("disconnect")]
-                    ),
+                    self._router,
                     ChannelTypeFilter(guild=True),
                     BotFilter(authored_by_bot=False),
                     EventTypeFilter(EventType.MESSAGE),
                     EventNormalization(),
                 ]
-            ),
-            chain_of(
-                [
-                    Volume(),
-                    Command("volume", rest_pattern="(?P<volume>.+)?"),
-                    Command("master"),
-                    ChannelTypeFilter(guild=True),
-                    BotFilter(authored_by_bot=False),
-                    EventTypeFilter(EventType.MESSAGE),
-                    EventNormalization(),
-                ]
-            ),
+            )
         ]
 
+    @property
+    def router(self) -> AudioRouter:
+        """Router of audio commands.
+
+        New audio commands can be registered in it.
+        """
+        return self._router
+
     @property
     def client_middleware(self) -> Sequence[Middleware]:
         return self._client_middleware
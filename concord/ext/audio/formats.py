@@ -0,0 +1,393 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import audioop
+import ctypes
+import functools
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import discord
+
+from concord.ext.audio.constants import CHANNELS, SAMPLING_RATE
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class AudioFormat(NamedTuple):
+    """Format of PCM audio.
+
+    Attributes:
+        sampling_rate: Sampling rate in Hz.
+        channels: Amount of interleaved channels.
+        sample_width: Size of a sample in bytes.
+        is_float: Are samples floating-point instead of signed integers.
+    """
+
+    sampling_rate: int = SAMPLING_RATE
+    channels: int = CHANNELS
+    sample_width: int = 2
+    is_float: bool = False
+
+    @property
+    def frame_width(self) -> int:
+        """Size of samples for all channels at one point in time."""
+        return self.channels * self.sample_width
+
+
+#: Format, that is expected by the mixer and by Discord.
+NATIVE_FORMAT = AudioFormat()
+
+_INTEGER_DTYPES = {1: "i1", 2: "<i2", 4: "<i4"}
+_FLOAT_DTYPES = {4: "<f4", 8: "<f8"}
+
+
+def _channel_matrix(source: int, target: int):
+    # Each source channel goes to the target channel with the same index
+    # modulo amount of target channels, and target channels are averaged.
+    matrix = numpy.zeros((source, target), dtype=numpy.float32)
+    for channel in range(source):
+        matrix[channel, channel % target] = 1.0
+    matrix /= numpy.maximum(matrix.sum(axis=0), 1.0)
+    return matrix
+
+
+@functools.lru_cache(maxsize=None)
+def conversion_plan(source: AudioFormat, target: AudioFormat) -> Tuple:
+    """Returns conversion stages from one format to another.
+
+    Plans are cached per pair of formats, so audio sources of the same format
+    share the plan, including channel mapping matrices. Stateful stages, like
+    resampling, keep their state in :class:`FormatConverter`.
+
+    Args:
+        source: Format to convert from.
+        target: Format to convert to. It should have integer samples.
+
+    Returns:
+        Tuple of stages. Each stage is a tuple of its name and arguments.
+
+    Raises:
+        ValueError: If conversion is not supported.
+    """
+    if target.is_float:
+        raise ValueError("Conversion to floating-point is not supported")
+    if source.channels < 1 or target.channels < 1:
+        raise ValueError("Amount of channels should be positive")
+    if target.sample_width not in (1, 2, 3, 4):
+        raise ValueError("Sample width should be from 1 to 4 bytes")
+
+    plan = []
+    width = source.sample_width
+
+    if source.is_float:
+        if numpy is None:
+            raise ValueError("Floating-point samples require NumPy")
+        if width not in _FLOAT_DTYPES:
+            raise ValueError("Floating-point samples should be 4 or 8 bytes")
+        plan.append(("float", (_FLOAT_DTYPES[width],)))
+        width = 2
+    elif width not in (1, 2, 3, 4):
+        raise ValueError("Sample width should be from 1 to 4 bytes")
+
+    if width != target.sample_width:
+        plan.append(("width", (width, target.sample_width)))
+        width = target.sample_width
+
+    channels = None
+    if source.channels != target.channels:
+        if (source.channels, target.channels) == (1, 2):
+            channels = ("stereo", (width,))
+        elif (source.channels, target.channels) == (2, 1):
+            channels = ("mono", (width,))
+        elif numpy is not None and width in _INTEGER_DTYPES:
+            channels = (
+                "matrix",
+                (
+                    _INTEGER_DTYPES[width],
+                    _channel_matrix(source.channels, target.channels),
+                ),
+            )
+        else:
+            raise ValueError("Channel mapping requires NumPy")
+
+    # Less channels are cheaper to resample, so downmixing goes first.
+    if channels is not None and target.channels < source.channels:
+        plan.append(channels)
+    if source.sampling_rate != target.sampling_rate:
+        plan.append(
+            (
+                "rate",
+                (
+                    width,
+                    min(source.channels, target.channels),
+                    source.sampling_rate,
+                    target.sampling_rate,
+                ),
+            )
+        )
+    if channels is not None and target.channels > source.channels:
+        plan.append(channels)
+
+    return tuple(plan)
+
+
+class FormatConverter:
+    """Converter of PCM fragments from one format to another.
+
+    Converter keeps state between fragments: incomplete samples are carried
+    over to the next fragment and resampling continues smoothly. Therefore,
+    each audio source needs its own converter.
+
+    Args:
+        source: Format to convert from.
+        target: Format to convert to.
+
+    Attributes:
+        source: Format to convert from.
+        target: Format to convert to.
+        _plan: Conversion stages.
+        _rate_state: State of the resampler.
+        _remainder: Bytes of the incomplete sample from the last fragment.
+
+    Raises:
+        ValueError: If conversion is not supported.
+    """
+
+    __slots__ = ("source", "target", "_plan", "_rate_state", "_remainder")
+
+    source: AudioFormat
+    target: AudioFormat
+
+    _plan: Tuple
+    _rate_state: Optional[tuple]
+    _remainder: bytes
+
+    def __init__(
+        self, source: AudioFormat, target: AudioFormat = NATIVE_FORMAT
+    ):
+        self.source = source
+        self.target = target
+        self._plan = conversion_plan(source, target)
+        self._rate_state = None
+        self._remainder = b""
+
+    def convert(self, fragment: bytes) -> bytes:
+        """Convert fragment.
+
+        Args:
+            fragment: Fragment in the source format. It's not required to
+                contain whole samples.
+
+        Returns:
+            Converted fragment. It can be empty, if fragment is too short.
+        """
+        frame_width = self.source.frame_width
+        if self._remainder:
+            fragment = self._remainder + bytes(fragment)
+        size = len(fragment) - len(fragment) % frame_width
+        self._remainder = bytes(fragment[size:])
+        data = fragment[:size]
+
+        for stage, args in self._plan:
+            if len(data) == 0:
+                break
+            if stage == "float":
+                samples = numpy.frombuffer(data, dtype=args[0])
+                data = (
+                    numpy.clip(samples * 32768.0, -32768, 32767)
+                    .astype("<i2")
+                    .tobytes()
+                )
+            elif stage == "width":
+                data = audioop.lin2lin(data, *args)
+            elif stage == "stereo":
+                data = audioop.tostereo(data, args[0], 1, 1)
+            elif stage == "mono":
+                data = audioop.tomono(data, args[0], 0.5, 0.5)
+            elif stage == "matrix":
+                dtype, matrix = args
+                samples = numpy.frombuffer(data, dtype=dtype).reshape(
+                    -1, matrix.shape[0]
+                )
+                info = numpy.iinfo(dtype)
+                data = (
+                    numpy.clip(samples @ matrix, info.min, info.max)
+                    .astype(dtype)
+                    .tobytes()
+                )
+            elif stage == "rate":
+                data, self._rate_state = audioop.ratecv(
+                    data, *args, self._rate_state
+                )
+        return bytes(data)
+
+
+class ConvertingSource(discord.AudioSource):
+    """Audio source wrapper, that converts PCM into another format.
+
+    Args:
+        original: Audio source, that returns PCM in the ``input_format``.
+        input_format: Format of the original audio source.
+        output_format: Format to convert to.
+
+    Attributes:
+        original: Audio source, that returns PCM in the input format.
+        converter: Converter of the fragments.
+
+    Raises:
+        ValueError: If not a PCM audio source provided, or conversion is not
+            supported.
+    """
+
+    original: discord.AudioSource
+    converter: FormatConverter
+
+    def __init__(
+        self,
+        original: discord.AudioSource,
+        input_format: AudioFormat,
+        *,
+        output_format: AudioFormat = NATIVE_FORMAT,
+    ):
+        if not isinstance(original, discord.AudioSource):
+            raise ValueError("Not an audio source")
+        if original.is_opus():
+            raise ValueError("Opus audio sources are not supported")
+
+        self.original = original
+        self.converter = FormatConverter(input_format, output_format)
+
+    def read(self) -> bytes:  # noqa: D102
+        while True:
+            fragment = self.original.read()
+            if len(fragment) == 0:
+                return b""
+            # Too short fragment is carried over, so read again.
+            data = self.converter.convert(fragment)
+            if len(data) > 0:
+                return data
+
+    def cleanup(self):  # noqa: D102
+        self.original.cleanup()
+
+
+#: Maximum amount of samples per channel in one Opus packet (120 ms).
+_MAX_PACKET_SAMPLES = 5760
+
+_decoder_functions: Dict[str, Any] = {}
+
+
+def _get_decoder_functions() -> Dict[str, Any]:
+    if len(_decoder_functions) > 0:
+        return _decoder_functions
+    # Newer discord.py loads libopus on demand.
+    load_default = getattr(discord.opus, "_load_default", None)
+    if not discord.opus.is_loaded() and (
+        load_default is None or not load_default()
+    ):
+        raise discord.opus.OpusNotLoaded()
+
+    # Indexing returns new function pointers, so prototypes, that discord.py
+    # may have set, are kept as is.
+    library = discord.opus._lib
+    create = library["opus_decoder_create"]
+    create.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int))
+    create.restype = ctypes.c_void_p
+    decode = library["opus_decode"]
+    decode.argtypes = (
+        ctypes.c_void_p,
+        ctypes.c_char_p,
+        ctypes.c_int32,
+        ctypes.POINTER(ctypes.c_int16),
+        ctypes.c_int,
+        ctypes.c_int,
+    )
+    decode.restype = ctypes.c_int
+    destroy = library["opus_decoder_destroy"]
+    destroy.argtypes = (ctypes.c_void_p,)
+    destroy.restype = None
+
+    _decoder_functions.update(create=create, decode=decode, destroy=destroy)
+    return _decoder_functions
+
+
+class _OpusDecoder:
+    # Decoder of discord.py is not present in all supported versions, so
+    # libopus, loaded by discord.py, is used directly.
+
+    def __init__(self):
+        self._functions = _get_decoder_functions()
+        error = ctypes.c_int()
+        self._state = self._functions["create"](
+            SAMPLING_RATE, CHANNELS, ctypes.byref(error)
+        )
+        if error.value != 0:
+            self._state = None
+            raise discord.opus.OpusError(error.value)
+        self._pcm = (ctypes.c_int16 * (_MAX_PACKET_SAMPLES * CHANNELS))()
+
+    def __del__(self):
+        if getattr(self, "_state", None) is not None:
+            self._functions["destroy"](self._state)
+            self._state = None
+
+    def decode(self, packet: bytes) -> bytes:
+        samples = self._functions["decode"](
+            self._state, packet, len(packet), self._pcm, _MAX_PACKET_SAMPLES, 0
+        )
+        if samples < 0:
+            raise discord.opus.OpusError(samples)
+        return ctypes.string_at(self._pcm, samples * CHANNELS * 2)
+
+
+class OpusDecodingSource(discord.AudioSource):
+    """Audio source wrapper, that decodes Opus packets into PCM.
+
+    Decoder is created immediately, so missing libopus is reported by the
+    constructor, not by the first read.
+
+    Args:
+        original: Audio source, that returns Opus packets.
+
+    Attributes:
+        original: Audio source, that returns Opus packets.
+        _decoder: Decoder of the packets.
+
+    Raises:
+        discord.opus.OpusNotLoaded: If libopus is not loaded.
+    """
+
+    original: discord.AudioSource
+
+    def __init__(self, original: discord.AudioSource):
+        self.original = original
+        self._decoder = _OpusDecoder()
+
+    def read(self) -> bytes:  # noqa: D102
+        packet = self.original.read()
+        if len(packet) == 0:
+            return b""
+        return self._decoder.decode(packet)
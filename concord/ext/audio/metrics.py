@@ -0,0 +1,173 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import bisect
+from typing import Any, Dict, List, Sequence
+
+# Bucket bounds in seconds. Frame deadline is 20 ms.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02)
+
+
+class Histogram:
+    """Histogram of durations with fixed buckets.
+
+    Args:
+        bounds: Upper bounds of buckets in seconds, sorted. Values, greater
+            than the last bound, are counted in the overflow bucket.
+
+    Attributes:
+        bounds: Upper bounds of buckets in seconds.
+        counts: Amount of values in each bucket, including overflow bucket.
+        count: Total amount of values.
+        total: Sum of values.
+        max: Maximum value.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    bounds: Sequence[float]
+    counts: List[int]
+    count: int
+    total: float
+    max: float
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """Count the value."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns histogram as a dictionary."""
+        return {
+            "bounds": list(self.bounds),
+            "counts": list(self.counts),
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+
+class SourceMetrics:
+    """Metrics of the audio source in the audio state.
+
+    Attributes:
+        read_time: Histogram of time spent for reading one frame.
+        underruns: Amount of frames, the source was not ready to return.
+        budget_violations: Amount of reads, that took longer than the
+            per-source budget.
+    """
+
+    __slots__ = ("read_time", "underruns", "budget_violations")
+
+    read_time: Histogram
+    underruns: int
+    budget_violations: int
+
+    def __init__(self):
+        self.read_time = Histogram()
+        self.underruns = 0
+        self.budget_violations = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns metrics as a dictionary."""
+        return {
+            "read_time": self.read_time.as_dict(),
+            "underruns": self.underruns,
+            "budget_violations": self.budget_violations,
+        }
+
+
+class AudioStateMetrics:
+    """Real-time metrics of the audio state.
+
+    Attributes:
+        mix_time: Histogram of time spent for producing one frame.
+        frames: Amount of produced frames, including silence.
+        idle_frames: Amount of silence frames, produced while being idle.
+        opus_frames: Amount of Opus packets, passed as is.
+        underruns: Amount of frames, audio sources were not ready to return.
+        budget_violations: Amount of reads, that took longer than the
+            per-source budget.
+        short_fragments: Amount of fragments, returned by audio sources,
+            that were shorter than a frame.
+        clipped_samples: Amount of samples, clipped while mixing. Counted only
+            by mixers, that support it.
+        active_sources: Amount of audio sources on the last frame.
+    """
+
+    __slots__ = (
+        "mix_time",
+        "frames",
+        "idle_frames",
+        "opus_frames",
+        "underruns",
+        "budget_violations",
+        "short_fragments",
+        "clipped_samples",
+        "active_sources",
+    )
+
+    mix_time: Histogram
+    frames: int
+    idle_frames: int
+    opus_frames: int
+    underruns: int
+    budget_violations: int
+    short_fragments: int
+    clipped_samples: int
+    active_sources: int
+
+    def __init__(self):
+        self.mix_time = Histogram()
+        self.frames = 0
+        self.idle_frames = 0
+        self.opus_frames = 0
+        self.underruns = 0
+        self.budget_violations = 0
+        self.short_fragments = 0
+        self.clipped_samples = 0
+        self.active_sources = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns metrics as a dictionary."""
+        return {
+            "mix_time": self.mix_time.as_dict(),
+            "frames": self.frames,
+            "idle_frames": self.idle_frames,
+            "opus_frames": self.opus_frames,
+            "underruns": self.underruns,
+            "budget_violations": self.budget_violations,
+            "short_fragments": self.short_fragments,
+            "clipped_samples": self.clipped_samples,
+            "active_sources": self.active_sources,
+        }
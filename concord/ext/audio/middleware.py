@@ -22,21 +22,42 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 import asyncio
-from typing import Callable, Optional
+import re
+from typing import Any, Callable, Dict, List, Optional, Pattern, Union
 
 import discord
 
 from concord.context import Context
-from concord.middleware import Middleware, MiddlewareState
+from concord.ext.base import CommandContextState
+from concord.middleware import Middleware, MiddlewareResult, MiddlewareState
 
-from concord.ext.audio.state import State
+from concord.ext.audio.shard import RemoteAudioState, ShardedState
+from concord.ext.audio.state import AudioState, State
+
+
+def _get_state(ctx: Context) -> Optional[Union[State, ShardedState]]:
+    # Sharded state is provided instead of the state, if audio is sharded.
+    state = MiddlewareState.get_state(ctx, State)
+    if state is None:
+        state = MiddlewareState.get_state(ctx, ShardedState)
+    return state
+
+
+async def _set_voice_client(
+    audio_state: Union[AudioState, RemoteAudioState],
+    voice_client: discord.VoiceClient,
+):
+    result = audio_state.set_voice_client(voice_client)
+    # Sharded audio state is set, when worker process has applied it.
+    if result is not None:
+        await asyncio.wrap_future(result)
 
 
 class Join(Middleware):
     """Middleware for joining to the user's voice channel."""
 
     async def run(self, *_, ctx: Context, next: Callable, **kw):  # noqa: D102
-        state = MiddlewareState.get_state(ctx, State)
+        state = _get_state(ctx)
         if state is None:
             return
 
@@ -58,21 +79,26 @@ class Join(Middleware):
 
         if voice_client is None:
             try:
-                voice_client = await voice_channel.connect()
+                # Connects are limited and retried by the connection manager.
+                # Voice client is set to the audio state as well.
+                voice_client = await audio_state.connect(voice_channel)
             except asyncio.TimeoutError:
                 await channel.send(
                     "Unfortunately, something wrong happened and I hasn't "
                     "joined your channel in a time."
                 )
                 return
+            # Concurrent join could connect to another channel of the guild.
+            if voice_client.channel != voice_channel:
+                await voice_client.move_to(voice_channel)
             await channel.send("Connected.")
         elif voice_client.channel != voice_channel:
             await voice_client.move_to(voice_channel)
             await channel.send("Moved.")
+            await _set_voice_client(audio_state, voice_client)
         else:
             await channel.send("I'm already in your voice channel.")
-        #
-        audio_state.set_voice_client(voice_client)
+            await _set_voice_client(audio_state, voice_client)
 
 
 class Leave(Middleware):
@@ -110,7 +136,7 @@ class Volume(Middleware):
         volume: Optional[str] = None,
         **kw,
     ):  # noqa: D102
-        state = MiddlewareState.get_state(ctx, State)
+        state = _get_state(ctx)
         if state is None:
             return
 
@@ -129,3 +155,126 @@ class Volume(Middleware):
         await channel.send(
             f"Master volume is set to {audio_state.master_volume}"
         )
+
+
+_WORD = re.compile(r"\s*(\w+)")
+
+
+class _Route:
+    __slots__ = ("handler", "pattern", "rest_pattern", "words")
+
+    handler: Middleware
+    pattern: Pattern
+    rest_pattern: Optional[Pattern]
+    words: int
+
+    def __init__(
+        self, handler: Middleware, name: str, rest_pattern: Optional[str]
+    ):
+        words = name.split()
+        self.handler = handler
+        self.pattern = re.compile(
+            r"\s+".join(re.escape(word) for word in words) + r"\b", re.I
+        )
+        self.rest_pattern = (
+            re.compile(rest_pattern) if rest_pattern is not None else None
+        )
+        self.words = len(words)
+
+
+class AudioRouter(Middleware):
+    """Middleware for dispatching audio commands to their handlers.
+
+    It replaces a chain with :class:`concord.ext.base.Command` filters for
+    each command: the first word of a message is looked up in the table of
+    command names, so messages without audio commands are ignored after a
+    single lookup. It should be chained with common filters, like
+    :class:`concord.ext.base.EventNormalization`, only once.
+
+    Matching is the same, as for :class:`concord.ext.base.Command`: command
+    names are case-insensitive whole words, and the rest of a message is
+    matched by the ``rest_pattern``, if provided. Named groups of the rest
+    pattern are passed to the handler as keyword arguments.
+
+    Attributes:
+        _routes: Routes by the first word of the command name, longest
+            command names first.
+    """
+
+    _routes: Dict[str, List[_Route]]
+
+    def __init__(self):
+        super().__init__()
+        self._routes = {}
+
+    def register(
+        self,
+        handler: Middleware,
+        *names: str,
+        rest_pattern: Optional[str] = None,
+    ):
+        """Register handler for commands with given names.
+
+        Args:
+            handler: Middleware, that handles the command.
+            *names: Names of the command and its aliases. Name can consist of
+                several words, like ``"master volume"``.
+            rest_pattern: The regex string to process the rest part of a
+                message.
+
+        Raises:
+            ValueError: If no names provided, or name is empty.
+        """
+        if len(names) == 0:
+            raise ValueError("At least one name should be provided")
+        for name in names:
+            words = name.split()
+            if len(words) == 0:
+                raise ValueError("Name should not be empty")
+            routes = self._routes.setdefault(words[0].lower(), [])
+            routes.append(_Route(handler, name, rest_pattern))
+            routes.sort(key=lambda route: route.words, reverse=True)
+
+    async def run(
+        self, *args, ctx: Context, next: Callable, **kwargs
+    ) -> Union[MiddlewareResult, Any]:  # noqa: D102
+        state = MiddlewareState.get_state(ctx, CommandContextState)
+        if state is None:
+            state = CommandContextState()
+            MiddlewareState.set_state(ctx, state)
+
+        part = ctx.kwargs["message"].content[state.last_position :]
+        word = _WORD.match(part)
+        if word is None:
+            return MiddlewareResult.IGNORE
+        routes = self._routes.get(word.group(1).lower())
+        if routes is None:
+            return MiddlewareResult.IGNORE
+
+        clean = part.lstrip()
+        offset = len(part) - len(clean)
+        for route in routes:
+            result = route.pattern.match(clean)
+            if result is None:
+                continue
+            position = offset + result.end()
+            route_kwargs = kwargs
+
+            if route.rest_pattern is not None:
+                rest = part[position:]
+                clean_rest = rest.lstrip()
+                rest_result = route.rest_pattern.match(clean_rest)
+                if rest_result is None:
+                    continue
+                route_kwargs = {**kwargs, **rest_result.groupdict()}
+                position += len(rest) - len(clean_rest) + rest_result.end()
+
+            state.last_position += position
+            try:
+                return await route.handler.run(
+                    *args, ctx=ctx, next=next, **route_kwargs
+                )
+            finally:
+                state.last_position -= position
+
+        return MiddlewareResult.IGNORE
@@ -0,0 +1,193 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import abc
+import audioop
+import functools
+from typing import Optional, Sequence
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class Mixer(abc.ABC):
+    """Base class for mixer backends.
+
+    Mixer takes the list of PCM fragments (16-bit signed, native for Discord
+    stereo 48 kHz), one fragment per audio source, and produces a single
+    fragment with all of them mixed.
+
+    All fragments provided to the mixer are of the same size. Each fragment
+    can be scaled by its own gain while mixing, so volume is applied in the
+    same pass as summing.
+
+    .. warning::
+        Mixers are allowed to keep internal buffers between calls, so a mixer
+        instance should not be shared between audio states.
+
+    Attributes:
+        track_clipping: Should mixer count clipped samples. Not all mixers
+            support it.
+        clipped_samples: Amount of samples clipped while mixing.
+    """
+
+    track_clipping: bool
+    clipped_samples: int
+
+    def __init__(self):
+        self.track_clipping = False
+        self.clipped_samples = 0
+
+    @abc.abstractmethod
+    def mix(
+        self,
+        fragments: Sequence[bytes],
+        gains: Optional[Sequence[float]] = None,
+    ) -> bytes:
+        """Mix fragments into one.
+
+        Args:
+            fragments: Non-empty sequence of equally sized PCM fragments. Any
+                bytes-like objects are accepted.
+            gains: Gain for each fragment. If not provided, fragments are mixed
+                as is, without any multiplication.
+
+        Returns:
+            Mixed fragment as :class:`bytes`.
+        """
+        pass  # pragma: no cover
+
+
+class AudioopMixer(Mixer):
+    """Mixer backed by the :mod:`audioop` module.
+
+    Fragments are added pairwise, so the result is saturated on each step.
+    Clipped samples are not counted.
+    """
+
+    def mix(
+        self,
+        fragments: Sequence[bytes],
+        gains: Optional[Sequence[float]] = None,
+    ) -> bytes:  # noqa: D102
+        if gains is not None:
+            fragments = [
+                fragment if gain == 1.0 else audioop.mul(fragment, 2, gain)
+                for fragment, gain in zip(fragments, gains)
+            ]
+        if len(fragments) == 1:
+            return bytes(fragments[0])
+        return functools.reduce(lambda x, y: audioop.add(x, y, 2), fragments)
+
+
+class NumpyMixer(Mixer):
+    """Mixer backed by NumPy.
+
+    Fragments are summed in one pass into the 32-bit accumulator, which is
+    saturated only once at the end. If gains are provided, the floating point
+    accumulator is used instead and fragments are scaled while summing.
+
+    Raises:
+        RuntimeError: If NumPy is not installed.
+    """
+
+    def __init__(self):
+        if numpy is None:
+            raise RuntimeError("NumPy is not installed")
+        super().__init__()
+        self._accumulator = numpy.empty(0, dtype=numpy.int32)
+        self._float_accumulator = numpy.empty(0, dtype=numpy.float32)
+        self._scratch = numpy.empty(0, dtype=numpy.float32)
+
+    def mix(
+        self,
+        fragments: Sequence[bytes],
+        gains: Optional[Sequence[float]] = None,
+    ) -> bytes:  # noqa: D102
+        if gains is not None:
+            return self._mix_scaled(fragments, gains)
+        if len(fragments) == 1:
+            return bytes(fragments[0])
+
+        samples = len(fragments[0]) // 2
+        if len(self._accumulator) != samples:
+            self._accumulator = numpy.empty(samples, dtype=numpy.int32)
+        accumulator = self._accumulator
+
+        accumulator[:] = numpy.frombuffer(fragments[0], dtype="<i2")
+        for fragment in fragments[1:]:
+            accumulator += numpy.frombuffer(fragment, dtype="<i2")
+
+        if self.track_clipping:
+            self._count_clipped(accumulator)
+        numpy.clip(accumulator, -32768, 32767, out=accumulator)
+        return accumulator.astype("<i2").tobytes()
+
+    def _mix_scaled(
+        self, fragments: Sequence[bytes], gains: Sequence[float]
+    ) -> bytes:
+        samples = len(fragments[0]) // 2
+        if len(self._float_accumulator) != samples:
+            self._float_accumulator = numpy.empty(samples, dtype=numpy.float32)
+            self._scratch = numpy.empty(samples, dtype=numpy.float32)
+        accumulator = self._float_accumulator
+        scratch = self._scratch
+
+        numpy.multiply(
+            numpy.frombuffer(fragments[0], dtype="<i2"),
+            gains[0],
+            out=accumulator,
+            casting="unsafe",
+        )
+        for fragment, gain in zip(fragments[1:], gains[1:]):
+            numpy.multiply(
+                numpy.frombuffer(fragment, dtype="<i2"),
+                gain,
+                out=scratch,
+                casting="unsafe",
+            )
+            accumulator += scratch
+
+        if self.track_clipping:
+            self._count_clipped(accumulator)
+        numpy.clip(accumulator, -32768, 32767, out=accumulator)
+        return accumulator.astype("<i2").tobytes()
+
+    def _count_clipped(self, accumulator):
+        self.clipped_samples += int(
+            numpy.count_nonzero(accumulator > 32767)
+            + numpy.count_nonzero(accumulator < -32768)
+        )
+
+
+def default_mixer() -> Mixer:
+    """Returns the best mixer available.
+
+    :class:`NumpyMixer` is used, if NumPy is installed, otherwise
+    :class:`AudioopMixer` is used as a fallback.
+    """
+    if numpy is not None:
+        return NumpyMixer()
+    return AudioopMixer()
@@ -0,0 +1,163 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import collections
+import logging
+import threading
+from typing import Deque
+
+import discord
+
+from concord.ext.audio.buffer import FrameBuffer
+from concord.ext.audio.constants import SILENCE
+
+
+log = logging.getLogger(__name__)
+
+
+class PrefetchSource(discord.AudioSource):
+    """Audio source wrapper, that reads the original source ahead of time.
+
+    Frames are read by the background thread into the bounded buffer, so slow
+    audio sources (like FFmpeg pipes or network-backed sources) do not block
+    the player thread. If there is no frame ready yet, silence is returned
+    instead and underrun is counted.
+
+    Background thread is started immediately, so frames are prefetched even
+    before the first read.
+
+    .. note::
+        Thread is stopped only when original source ends, or when
+        :meth:`close` or :meth:`cleanup` is called. Do not forget to call
+        them, if source is removed before its end.
+
+    Args:
+        original: Audio source to read ahead.
+        depth: Maximum amount of frames to read ahead.
+        pad: Should the last frame be filled with silence, if original source
+            ends in the middle of it.
+
+    Attributes:
+        original: Audio source to read ahead.
+        depth: Maximum amount of frames to read ahead.
+        pad: Should the last frame be filled with silence.
+        underruns: Amount of reads, when there was no frame ready.
+        _frames: Prefetched frames.
+        _condition: Condition for waiting for free space in the buffer.
+        _is_ended: Is original source has ended.
+        _is_closed: Is prefetching has been stopped.
+        _thread: Background thread.
+    """
+
+    original: discord.AudioSource
+    depth: int
+    pad: bool
+    underruns: int
+
+    _frames: Deque[bytes]
+    _condition: threading.Condition
+    _is_ended: bool
+    _is_closed: bool
+    _thread: threading.Thread
+
+    def __init__(
+        self,
+        original: discord.AudioSource,
+        *,
+        depth: int = 10,
+        pad: bool = True,
+    ):
+        if not isinstance(original, discord.AudioSource):
+            raise ValueError("Not an audio source")
+        if original.is_opus():
+            raise ValueError("Opus audio sources are not supported")
+        if depth < 1:
+            raise ValueError("Depth should be positive")
+
+        self.original = original
+        self.depth = depth
+        self.pad = pad
+        self.underruns = 0
+
+        self._frames = collections.deque()
+        self._condition = threading.Condition()
+        self._is_ended = False
+        self._is_closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"prefetch-{id(self):x}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def buffered(self) -> int:
+        """Amount of frames, that are ready to read."""
+        return len(self._frames)
+
+    def _run(self):
+        buffer = FrameBuffer(pad=self.pad)
+
+        try:
+            while not self._is_closed:
+                frame = buffer.pull(self.original)
+                if frame is None:
+                    break
+                frame = bytes(frame)
+
+                with self._condition:
+                    while (
+                        len(self._frames) >= self.depth and not self._is_closed
+                    ):
+                        self._condition.wait()
+                    self._frames.append(frame)
+        except Exception:
+            log.exception("Exception while prefetching audio source")
+        finally:
+            self._is_ended = True
+
+    def read(self) -> bytes:  # noqa: D102
+        try:
+            frame = self._frames.popleft()
+        except IndexError:
+            # There can be a frame appended right after the first check.
+            if self._is_ended and len(self._frames) == 0:
+                return b""
+            self.underruns += 1
+            return SILENCE
+
+        with self._condition:
+            self._condition.notify()
+        return frame
+
+    def close(self):
+        """Stop prefetching and drop prefetched frames.
+
+        Original source is not cleaned up.
+        """
+        with self._condition:
+            self._is_closed = True
+            self._frames.clear()
+            self._condition.notify()
+
+    def cleanup(self):  # noqa: D102
+        self.close()
+        self.original.cleanup()
@@ -0,0 +1,428 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import concurrent.futures
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Callable, Iterable, Optional, Sequence, Union
+
+import discord
+
+from concord.ext.audio.buffer import FrameBuffer
+from concord.ext.audio.constants import FRAME_SIZE, SILENCE
+
+
+log = logging.getLogger(__name__)
+
+# Header of the ring: write index, read index, producer flags, consumer flags.
+# Each field is written by one side only.
+_HEADER = struct.Struct("<QQQQ")
+_WRITE_OFFSET = 0
+_READ_OFFSET = 8
+_PRODUCER_OFFSET = 16
+_CONSUMER_OFFSET = 24
+_INDEX = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+_SLOT_SIZE = _LENGTH.size + FRAME_SIZE
+
+_ENDED = 1
+_CLOSED = 1
+
+
+class SharedFrameRing:
+    """Single-producer single-consumer ring of frames in shared memory.
+
+    Ring is backed by memory-mapped file, so it can be attached by another
+    process by the file path. Frames are copied into the ring slots by the
+    producer and returned as memory views of the slots to the consumer, so
+    nothing is pickled or copied on the consumer side.
+
+    The slot, returned by :meth:`get`, is released only on the next
+    :meth:`get` call, so the returned view is valid until then.
+
+    Args:
+        path: Path to the file of the ring.
+        capacity: Amount of frame slots.
+        owner: Is ring should remove its file on close.
+
+    Attributes:
+        path: Path to the file of the ring.
+        capacity: Amount of frame slots.
+    """
+
+    path: str
+    capacity: int
+
+    _owner: bool
+    _mmap: mmap.mmap
+    _view: Optional[memoryview]
+    _pending: bool
+
+    def __init__(self, path: str, capacity: int, *, owner: bool = False):
+        self.path = path
+        self.capacity = capacity
+        self._owner = owner
+        self._pending = False
+
+        with open(path, "r+b") as file:
+            self._mmap = mmap.mmap(file.fileno(), self.size(capacity))
+        self._view = memoryview(self._mmap)
+
+    @staticmethod
+    def size(capacity: int) -> int:
+        """Returns size of the ring file in bytes."""
+        return _HEADER.size + capacity * _SLOT_SIZE
+
+    @classmethod
+    def create(cls, capacity: int) -> "SharedFrameRing":
+        """Create new ring in a temporary file.
+
+        File is created in ``/dev/shm``, if available.
+
+        Args:
+            capacity: Amount of frame slots.
+
+        Returns:
+            Ring, that owns the file.
+        """
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        fd, path = tempfile.mkstemp(prefix="concord-audio-", dir=directory)
+        try:
+            os.ftruncate(fd, cls.size(capacity))
+        finally:
+            os.close(fd)
+        return cls(path, capacity, owner=True)
+
+    def _get(self, offset: int) -> int:
+        return _INDEX.unpack_from(self._mmap, offset)[0]
+
+    def _set(self, offset: int, value: int):
+        _INDEX.pack_into(self._mmap, offset, value)
+
+    def __len__(self) -> int:
+        return self._get(_WRITE_OFFSET) - self._get(_READ_OFFSET)
+
+    @property
+    def is_ended(self) -> bool:
+        """Is producer has finished writing frames."""
+        return self._get(_PRODUCER_OFFSET) & _ENDED != 0
+
+    @property
+    def is_closed(self) -> bool:
+        """Is consumer has closed the ring."""
+        return self._get(_CONSUMER_OFFSET) & _CLOSED != 0
+
+    def put(self, frame: bytes, *, poll_interval: float = 0.005) -> bool:
+        """Write frame into the ring, waiting for the free slot.
+
+        Args:
+            frame: Frame to write, not larger than the frame size.
+            poll_interval: Interval in seconds between checks for a free slot.
+
+        Returns:
+            ``False``, if ring has been closed by consumer.
+        """
+        write_index = self._get(_WRITE_OFFSET)
+
+        while write_index - self._get(_READ_OFFSET) >= self.capacity:
+            if self.is_closed:
+                return False
+            time.sleep(poll_interval)
+
+        offset = _HEADER.size + (write_index % self.capacity) * _SLOT_SIZE
+        _LENGTH.pack_into(self._mmap, offset, len(frame))
+        start = offset + _LENGTH.size
+        self._view[start : start + len(frame)] = frame
+        # Index is updated after the slot, so consumer sees complete frame.
+        self._set(_WRITE_OFFSET, write_index + 1)
+        return not self.is_closed
+
+    def end(self):
+        """Mark, that there will be no more frames."""
+        self._set(_PRODUCER_OFFSET, _ENDED)
+
+    def get(self) -> Optional[memoryview]:
+        """Read the next frame from the ring, if ready.
+
+        Returns:
+            Memory view of the frame, or ``None``, if there is no frame ready.
+        """
+        read_index = self._get(_READ_OFFSET)
+        if self._pending:
+            read_index += 1
+            self._set(_READ_OFFSET, read_index)
+            self._pending = False
+
+        if read_index == self._get(_WRITE_OFFSET):
+            return None
+
+        offset = _HEADER.size + (read_index % self.capacity) * _SLOT_SIZE
+        length = _LENGTH.unpack_from(self._mmap, offset)[0]
+        start = offset + _LENGTH.size
+        self._pending = True
+        return self._view[start : start + length]
+
+    def close(self):
+        """Close the ring.
+
+        Producer will stop on the next write. File is removed, if owned.
+        Memory stays mapped until :meth:`release` is called, or the ring is
+        garbage collected, so it can be closed from another thread, while the
+        consumer is reading.
+        """
+        if self._view is None:
+            return
+        self._set(_CONSUMER_OFFSET, _CLOSED)
+        if self._owner:
+            self._owner = False
+            try:
+                os.remove(self.path)
+            except OSError:
+                log.warning("Unable to remove shared frame ring file")
+
+    def release(self):
+        """Unmap the ring, without closing it for the other side.
+
+        If frames, returned by :meth:`get`, are still referenced, memory is
+        unmapped, when they are garbage collected.
+        """
+        if self._view is None:
+            return
+        self._view.release()
+        self._view = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+
+class _IterableSource(discord.AudioSource):
+    def __init__(self, fragments: Iterable[bytes]):
+        self._iterator = iter(fragments)
+
+    def read(self) -> bytes:
+        return next(self._iterator, b"")
+
+
+def _decode(
+    factory: Callable[[], Union[discord.AudioSource, Iterable[bytes]]],
+    effects: Sequence[Callable[[bytes], bytes]],
+    path: str,
+    capacity: int,
+    poll_interval: float,
+):
+    # Runs in the worker process.
+    ring = SharedFrameRing(path, capacity)
+    source = factory()
+    if not isinstance(source, discord.AudioSource):
+        source = _IterableSource(source)
+    buffer = FrameBuffer()
+
+    try:
+        while not ring.is_closed:
+            frame = buffer.pull(source)
+            if frame is None:
+                break
+            frame = bytes(frame)
+            for effect in effects:
+                frame = effect(frame)
+            if not ring.put(frame, poll_interval=poll_interval):
+                break
+    finally:
+        ring.end()
+        ring.release()
+        source.cleanup()
+
+
+class DecoderPool:
+    """Pool of worker processes for decoding audio sources.
+
+    Decoding, resampling and per-source effects run in worker processes, so
+    they do not compete for the GIL with the loop and the mixer. Decoded
+    frames are passed through :class:`SharedFrameRing`, without pickling.
+
+    Each decoding audio source occupies one worker until it ends or is
+    cleaned up, so amount of workers limits amount of simultaneously decoded
+    sources. Sources, that are above the limit, wait in the queue and play
+    silence until decoding is started.
+
+    Args:
+        workers: Amount of worker processes.
+        depth: Default amount of frames in the ring of each source. Worker
+            waits for free slots, when ring is full.
+        poll_interval: Interval in seconds, used by workers to wait for free
+            slots.
+
+    Attributes:
+        depth: Default amount of frames in the ring of each source.
+        poll_interval: Interval in seconds, used by workers to wait for free
+            slots.
+        _executor: Process pool executor.
+    """
+
+    depth: int
+    poll_interval: float
+
+    _executor: concurrent.futures.ProcessPoolExecutor
+
+    def __init__(
+        self,
+        *,
+        workers: Optional[int] = None,
+        depth: int = 50,
+        poll_interval: float = 0.005,
+    ):
+        self.depth = depth
+        self.poll_interval = poll_interval
+        self._executor = concurrent.futures.ProcessPoolExecutor(workers)
+
+    def source(
+        self,
+        factory: Callable[[], Union[discord.AudioSource, Iterable[bytes]]],
+        *,
+        effects: Sequence[Callable[[bytes], bytes]] = (),
+        depth: Optional[int] = None,
+    ) -> "ProcessSource":
+        """Start decoding in a worker process.
+
+        Args:
+            factory: Picklable callable, that returns PCM audio source or
+                iterable of PCM fragments. It is called in the worker process.
+            effects: Picklable callables, that are applied to each frame in
+                the worker process.
+            depth: Amount of frames in the ring. If not provided, default one is
+                used.
+
+        Returns:
+            Audio source, that returns decoded frames.
+        """
+        ring = SharedFrameRing.create(depth or self.depth)
+        future = self._executor.submit(
+            _decode,
+            factory,
+            tuple(effects),
+            ring.path,
+            ring.capacity,
+            self.poll_interval,
+        )
+        return ProcessSource(ring, future)
+
+    def shutdown(self, *, wait: bool = True):
+        """Shutdown worker processes.
+
+        Audio sources should be cleaned up first, or shutdown will wait for
+        their end.
+        """
+        self._executor.shutdown(wait=wait)
+
+
+class ProcessSource(discord.AudioSource):
+    """Audio source, that returns frames decoded in a worker process.
+
+    Frames are memory views of the shared ring, so this source is intended to
+    be added to :class:`AudioState` rather than played by voice client
+    directly. If there is no frame ready, silence is returned and underrun is
+    counted.
+
+    Ring is closed, when the end is reached, or when :meth:`close` or
+    :meth:`cleanup` is called. Audio state closes it, when source is removed,
+    so the worker is released.
+
+    Args:
+        ring: Ring with decoded frames.
+        future: Future of the decoding task.
+
+    Attributes:
+        underruns: Amount of reads, when there was no frame ready.
+        _ring: Ring with decoded frames.
+        _future: Future of the decoding task.
+        _is_closed: Is ring has been closed.
+    """
+
+    underruns: int
+
+    _ring: SharedFrameRing
+    _future: concurrent.futures.Future
+    _is_closed: bool
+
+    def __init__(
+        self, ring: SharedFrameRing, future: concurrent.futures.Future
+    ):
+        self.underruns = 0
+        self._ring = ring
+        self._future = future
+        self._is_closed = False
+
+    @property
+    def buffered(self) -> int:
+        """Amount of frames, that are ready to read."""
+        if self._is_closed:
+            return 0
+        return len(self._ring)
+
+    def read(self) -> Union[bytes, memoryview]:  # noqa: D102
+        if self._is_closed:
+            return b""
+        ring = self._ring
+        frame = ring.get()
+        if frame is not None:
+            return frame
+
+        # The frame could be written right before the end.
+        if ring.is_ended and len(ring) == 0:
+            self._finish()
+            return b""
+        if self._future.done() and len(ring) == 0:
+            if not self._future.cancelled() and self._future.exception():
+                log.error(
+                    "Exception while decoding audio source",
+                    exc_info=self._future.exception(),
+                )
+            self._finish()
+            return b""
+
+        self.underruns += 1
+        return SILENCE
+
+    def _finish(self):
+        # Reads are done by this thread, so memory can be unmapped right away.
+        self.close()
+        self._ring.release()
+
+    def close(self):
+        """Stop decoding and close the ring.
+
+        Worker process is released on its next write.
+        """
+        if self._is_closed:
+            return
+        self._is_closed = True
+        self._future.cancel()
+        self._ring.close()
+
+    def cleanup(self):  # noqa: D102
+        self.close()
@@ -0,0 +1,369 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+from typing import Callable, Deque, Optional, Tuple, Union
+
+import discord
+
+from concord.ext.audio.constants import FRAME_LENGTH, FRAME_SIZE, SILENCE
+from concord.ext.audio.formats import OpusDecodingSource
+from concord.ext.audio.prefetch import PrefetchSource
+from concord.ext.audio.status import AudioStatus
+
+
+log = logging.getLogger(__name__)
+
+_BYTES_PER_SECOND = FRAME_SIZE * 1000 / FRAME_LENGTH
+
+
+class Track:
+    """Track of the queue.
+
+    Audio source of the track is created only on warm-up, so the queue can be
+    long without holding any decoders.
+
+    Attributes:
+        factory: Callable, that returns audio source of the track.
+        finalizer: The finalizer that will be called with the track and the
+            reason, when track is finished or removed from the queue.
+        duration: Duration of the track in seconds, if known.
+        descriptor: JSON-serializable description of the track, which allows
+            to recreate it, if any. It is saved in snapshots.
+        start: Time in seconds, from which audio source of the track starts.
+        source: Audio source of the track, once warmed up.
+        position: Amount of played bytes.
+        _reader: Prefetching reader of the audio source, once warmed up.
+        _is_started: Is warm-up has been started.
+        _is_failed: Is warm-up has failed.
+        _is_finished: Is track has been finished.
+    """
+
+    __slots__ = (
+        "factory",
+        "finalizer",
+        "duration",
+        "descriptor",
+        "start",
+        "source",
+        "position",
+        "_reader",
+        "_is_started",
+        "_is_failed",
+        "_is_finished",
+    )
+
+    factory: Callable[[], discord.AudioSource]
+    finalizer: Optional[Callable]
+    duration: Optional[float]
+    descriptor: Optional[dict]
+    start: float
+    source: Optional[discord.AudioSource]
+    position: int
+
+    _reader: Optional[PrefetchSource]
+    _is_started: bool
+    _is_failed: bool
+    _is_finished: bool
+
+    def __init__(
+        self,
+        factory: Callable[[], discord.AudioSource],
+        finalizer: Optional[Callable] = None,
+        duration: Optional[float] = None,
+        descriptor: Optional[dict] = None,
+        start: float = 0.0,
+    ):
+        self.factory = factory
+        self.finalizer = finalizer
+        self.duration = duration
+        self.descriptor = descriptor
+        self.start = start
+        self.source = None
+        self.position = 0
+        self._reader = None
+        self._is_started = False
+        self._is_failed = False
+        self._is_finished = False
+
+    @property
+    def elapsed(self) -> float:
+        """Played time in seconds, including the start time."""
+        return self.start + self.position / _BYTES_PER_SECOND
+
+
+class TrackQueue(discord.AudioSource):
+    """Audio source, that plays tracks one after another without gaps.
+
+    The next track is warmed up in the background thread ``lead_time``
+    seconds before the end of the current one (or right after the current one
+    has started, if its duration is unknown): its audio source is created and
+    frames are read ahead. The switch between tracks happens inside
+    :meth:`read`, so the tail of the current track and the head of the next
+    one are joined into the same frame by the audio state's frame buffer.
+
+    If the next track is not warmed up in time, silence is returned until it
+    is ready, and gap is counted.
+
+    Queue is intended to be played by :class:`AudioState`, see
+    :meth:`AudioState.enqueue`. It ends, when there are no tracks left.
+
+    Args:
+        loop: Loop, where finalizers of tracks should be called.
+        lead_time: Time in seconds before the end of the current track, when
+            the next one is warmed up.
+        depth: Amount of frames to read ahead for each track.
+
+    Attributes:
+        lead_time: Time in seconds before the end of the current track, when
+            the next one is warmed up.
+        depth: Amount of frames to read ahead for each track.
+        gaps: Amount of frames, that were silent due to the track, that was
+            not warmed up in time.
+        _loop: Loop, where finalizers of tracks should be called.
+        _tracks: Tracks, that are waiting for playing.
+        _current: Currently playing track.
+        _warm_at: Position of the current track, after which the next one
+            should be warmed up.
+        _skip: Is current track should be skipped on the next read.
+        _lock: Lock for modifying the tracks.
+    """
+
+    lead_time: float
+    depth: int
+    gaps: int
+
+    _loop: asyncio.AbstractEventLoop
+    _tracks: Deque[Track]
+    _current: Optional[Track]
+    _warm_at: float
+    _skip: bool
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        *,
+        lead_time: float = 5.0,
+        depth: int = 50,
+    ):
+        self.lead_time = lead_time
+        self.depth = depth
+        self.gaps = 0
+        self._loop = loop
+        self._tracks = collections.deque()
+        self._current = None
+        self._warm_at = 0
+        self._skip = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Amount of tracks, including the current one."""
+        return len(self._tracks) + (self._current is not None)
+
+    @property
+    def current(self) -> Optional[Track]:
+        """Currently playing track, if any."""
+        return self._current
+
+    @property
+    def tracks(self) -> Tuple[Track, ...]:
+        """Tracks, that are waiting for playing."""
+        return tuple(self._tracks)
+
+    def append(
+        self,
+        factory: Callable[[], discord.AudioSource],
+        *,
+        finalizer: Optional[Callable] = None,
+        duration: Optional[float] = None,
+        descriptor: Optional[dict] = None,
+        start: float = 0.0,
+    ) -> Track:
+        """Add track to the end of the queue.
+
+        Args:
+            factory: Callable, that returns audio source of the track. It is
+                called in the background thread.
+            finalizer: The finalizer that will be called with the track and
+                the reason, when track is finished or removed from the queue.
+                Possible reasons are enumerated in the :class:`AudioStatus`.
+            duration: Duration of the track in seconds, if known. It is used
+                for warming up the track just in time.
+            descriptor: JSON-serializable description of the track, which
+                allows to recreate it. It is saved in snapshots.
+            start: Time in seconds, from which audio source of the track
+                starts, if it is resumed.
+
+        Returns:
+            Added track.
+        """
+        track = Track(factory, finalizer, duration, descriptor, start)
+        with self._lock:
+            self._tracks.append(track)
+            current = self._current
+            # Track should be warmed up right away, if it's next and it's time.
+            if current is None or (
+                len(self._tracks) == 1 and current.position >= self._warm_at
+            ):
+                self._warm_up(track)
+        return track
+
+    def skip(self):
+        """Skip the current track.
+
+        Track is finished with the :attr:`AudioStatus.SOURCE_REMOVED` reason
+        on the next read.
+        """
+        self._skip = True
+
+    def clear(self, *, reason=AudioStatus.SOURCE_REMOVED):
+        """Remove all tracks, including the current one.
+
+        Args:
+            reason: Reason, provided to the tracks' finalizers.
+        """
+        with self._lock:
+            tracks = list(self._tracks)
+            if self._current is not None:
+                tracks.insert(0, self._current)
+            self._tracks.clear()
+            self._current = None
+        for track in tracks:
+            self._finalize(track, reason)
+
+    def _warm_up(self, track: Track):
+        # Called with the lock acquired.
+        if track._is_started:
+            return
+        track._is_started = True
+        threading.Thread(
+            target=self._create_reader, args=(track,), daemon=True
+        ).start()
+
+    def _create_reader(self, track: Track):
+        try:
+            source = track.factory()
+            reader = source
+            if reader.is_opus():
+                reader = OpusDecodingSource(reader)
+            reader = PrefetchSource(reader, depth=self.depth, pad=False)
+        except Exception:
+            log.exception("Exception while warming up track")
+            track._is_failed = True
+            return
+
+        with self._lock:
+            track.source = source
+            track._reader = reader
+            is_finished = track._is_finished
+        # Track could be removed while warming up.
+        if is_finished:
+            self._loop.call_soon_threadsafe(self._cleanup, source, reader)
+
+    def _advance(self) -> Optional[Track]:
+        with self._lock:
+            track = self._current = (
+                self._tracks.popleft() if len(self._tracks) > 0 else None
+            )
+            if track is None:
+                return None
+            self._warm_up(track)
+            if track.duration is not None:
+                self._warm_at = max(
+                    0,
+                    (track.duration - track.start - self.lead_time)
+                    * _BYTES_PER_SECOND,
+                )
+            else:
+                self._warm_at = 0
+            return track
+
+    def _end(self, track: Track, reason):
+        with self._lock:
+            if self._current is track:
+                self._current = None
+        self._loop.call_soon_threadsafe(self._finalize, track, reason)
+
+    def _finalize(self, track: Track, reason):
+        with self._lock:
+            # Track can be cleared, while the player is reading it.
+            if track._is_finished:
+                return
+            track._is_finished = True
+            reader = track._reader
+
+        if reader is not None:
+            self._cleanup(track.source, reader)
+        if track.finalizer is not None:
+            try:
+                track.finalizer(track, reason)
+            except Exception:
+                log.exception("Exception while finalizing track")
+
+    @staticmethod
+    def _cleanup(source: discord.AudioSource, reader: PrefetchSource):
+        reader.close()
+        source.cleanup()
+
+    def read(self) -> Union[bytes, memoryview]:  # noqa: D102
+        track = self._current
+        if self._skip:
+            self._skip = False
+            if track is not None:
+                self._end(track, AudioStatus.SOURCE_REMOVED)
+                track = None
+
+        while True:
+            if track is None:
+                track = self._advance()
+                if track is None:
+                    return b""
+
+            reader = track._reader
+            if reader is None:
+                if track._is_failed:
+                    self._end(track, AudioStatus.SOURCE_ENDED)
+                    track = None
+                    continue
+                self.gaps += 1
+                return SILENCE
+
+            fragment = reader.read()
+            if len(fragment) > 0:
+                break
+            self._end(track, AudioStatus.SOURCE_ENDED)
+            track = None
+
+        track.position += len(fragment)
+        if track.position >= self._warm_at and len(self._tracks) > 0:
+            with self._lock:
+                if len(self._tracks) > 0:
+                    self._warm_up(self._tracks[0])
+        return fragment
+
+    def cleanup(self):  # noqa: D102
+        self.clear()
@@ -0,0 +1,291 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import collections
+import threading
+from typing import Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import discord
+
+from concord.ext.audio.buffer import FrameBuffer
+from concord.ext.audio.formats import OpusDecodingSource
+from concord.ext.audio.metrics import SourceMetrics
+
+
+class SourceEntry:
+    """Audio source, registered in the audio state, with related data.
+
+    Attributes:
+        source: Registered audio source.
+        reader: Audio source to read frames from. It can be the registered
+            audio source itself, or the wrapper around it.
+        is_opus: Is reader produces Opus packets instead of PCM.
+        finalizer: The finalizer that will be called in case of source is
+            removed.
+        volume: Volume of the source, applied while mixing.
+        buffer: Buffer for assembling full frames from the source.
+        metrics: Metrics of the source, if collected.
+        is_ended: Is source has ended. Ended source is skipped by the mixer
+            until it is removed.
+        budget_violations: Amount of reads, that took longer than the
+            per-source budget of the audio state, or underruns of the
+            prefetching reader.
+        reads: Amount of reads of the prefetching reader.
+        underrun_reads: Numbers of the reads of the prefetching reader, that
+            have underrun, or ``None``, if it has not returned a frame yet.
+            Only the last ones are kept.
+        _pcm_reader: Reader, that returns PCM for Opus audio sources.
+    """
+
+    __slots__ = (
+        "source",
+        "reader",
+        "is_opus",
+        "finalizer",
+        "volume",
+        "buffer",
+        "metrics",
+        "is_ended",
+        "budget_violations",
+        "reads",
+        "underrun_reads",
+        "_pcm_reader",
+    )
+
+    source: discord.AudioSource
+    reader: discord.AudioSource
+    is_opus: bool
+    finalizer: Optional[Callable]
+    volume: float
+    buffer: FrameBuffer
+    metrics: Optional[SourceMetrics]
+    is_ended: bool
+    budget_violations: int
+    reads: int
+    underrun_reads: Optional[Deque[int]]
+    _pcm_reader: Optional[discord.AudioSource]
+
+    def __init__(
+        self,
+        source: discord.AudioSource,
+        finalizer: Optional[Callable],
+        volume: float = 1.0,
+        reader: Optional[discord.AudioSource] = None,
+    ):
+        self.source = source
+        self.reader = reader if reader is not None else source
+        self.is_opus = self.reader.is_opus()
+        self.finalizer = finalizer
+        self.volume = volume
+        self.buffer = FrameBuffer()
+        self.metrics = None
+        self.is_ended = False
+        self.budget_violations = 0
+        self.reads = 0
+        self.underrun_reads = None
+        # Decoder is created here, so missing libopus is reported to the one,
+        # who adds the source, instead of the player thread.
+        self._pcm_reader = (
+            OpusDecodingSource(self.reader) if self.is_opus else None
+        )
+
+    def track_underruns(self, strikes: int):
+        """Start tracking underruns of the prefetching reader.
+
+        Args:
+            strikes: Amount of the last underruns to keep.
+        """
+        self.underrun_reads = collections.deque(maxlen=strikes)
+
+    @property
+    def pcm_reader(self) -> discord.AudioSource:
+        """Audio source to read PCM fragments from.
+
+        For Opus audio sources, the decoder is created with the entry, or on
+        first access, if the reader has been replaced.
+        """
+        if not self.is_opus:
+            return self.reader
+        if self._pcm_reader is None:
+            self._pcm_reader = OpusDecodingSource(self.reader)
+        return self._pcm_reader
+
+
+class SourceRegistry:
+    """Copy-on-write registry of audio sources.
+
+    Modifications are serialized with a lock and each of them publishes a new
+    immutable snapshot of registered entries. Readers (like a player thread)
+    can iterate the latest snapshot without any locking or copying, since
+    snapshot is never changed after publishing.
+
+    Attributes:
+        _entries: Entries by audio source, for lookups.
+        _snapshot: Pair of the snapshot version and the tuple of entries.
+        _changes: Counter of changes, that affect mixing.
+        _lock: Lock for serializing modifications.
+    """
+
+    __slots__ = ("_entries", "_snapshot", "_changes", "_lock")
+
+    _entries: Dict[discord.AudioSource, SourceEntry]
+    _snapshot: Tuple[int, Tuple[SourceEntry, ...]]
+    _changes: int
+    _lock: threading.Lock
+
+    def __init__(self):
+        self._entries = {}
+        self._snapshot = (0, ())
+        self._changes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Tuple[int, Tuple[SourceEntry, ...]]:
+        """Version and entries of the latest published snapshot."""
+        return self._snapshot
+
+    @property
+    def entries(self) -> Tuple[SourceEntry, ...]:
+        """Entries of the latest published snapshot."""
+        return self._snapshot[1]
+
+    @property
+    def version(self) -> int:
+        """Version of the latest published snapshot.
+
+        Version is increased on each modification.
+        """
+        return self._snapshot[0]
+
+    @property
+    def changes(self) -> int:
+        """Counter of changes, that affect mixing.
+
+        Counter is increased on each modification and on each volume change
+        (see :meth:`touch`), so mixed frames can be reused, while it stays
+        the same.
+        """
+        return self._changes
+
+    def touch(self):
+        """Increase the counter of changes after changing the volume.
+
+        Volume should be changed before the call, so the one, who sees the new
+        counter, sees the new volume as well.
+        """
+        with self._lock:
+            self._changes += 1
+
+    def __len__(self) -> int:
+        return len(self._snapshot[1])
+
+    def __contains__(self, source: discord.AudioSource) -> bool:
+        return source in self._entries
+
+    def __iter__(self) -> Iterator[SourceEntry]:
+        return iter(self._snapshot[1])
+
+    def get(self, source: discord.AudioSource) -> Optional[SourceEntry]:
+        """Returns entry for given audio source, if registered."""
+        return self._entries.get(source)
+
+    def add(
+        self,
+        source: discord.AudioSource,
+        finalizer: Optional[Callable] = None,
+        volume: float = 1.0,
+        reader: Optional[discord.AudioSource] = None,
+    ) -> SourceEntry:
+        """Register audio source.
+
+        If audio source is already present, the ``finalizer`` and the
+        ``volume`` will be replaced.
+
+        Args:
+            source: Audio source to register.
+            finalizer: The finalizer of audio source.
+            volume: Volume of audio source.
+            reader: Audio source to read frames from, if differs. It is used
+                only, if audio source is not present yet.
+
+        Returns:
+            Entry of the audio source.
+        """
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is not None:
+                entry.finalizer = finalizer
+                entry.volume = volume
+                self._changes += 1
+                return entry
+
+            entry = self._entries[source] = SourceEntry(
+                source, finalizer, volume, reader
+            )
+            self._publish()
+            return entry
+
+    def replace_reader(
+        self, entry: SourceEntry, reader: discord.AudioSource
+    ) -> bool:
+        """Replace reader of the registered entry.
+
+        Reader is replaced only while entry is registered, so the one, who
+        unregisters the entry, always sees the latest reader and can clean it.
+
+        Args:
+            entry: Entry to replace reader of.
+            reader: New audio source to read frames from.
+
+        Returns:
+            ``True``, if reader has been replaced, or ``False``, if entry is
+            not registered.
+        """
+        with self._lock:
+            if self._entries.get(entry.source) is not entry:
+                return False
+            entry.reader = reader
+            entry.is_opus = reader.is_opus()
+            entry._pcm_reader = None
+            return True
+
+    def pop(self, source: discord.AudioSource) -> SourceEntry:
+        """Unregister audio source.
+
+        Args:
+            source: Audio source to unregister.
+
+        Returns:
+            Entry of the audio source.
+
+        Raises:
+            KeyError: If source is not present.
+        """
+        with self._lock:
+            entry = self._entries.pop(source)
+            self._publish()
+            return entry
+
+    def _publish(self):
+        self._snapshot = (self._snapshot[0] + 1, tuple(self._entries.values()))
+        self._changes += 1
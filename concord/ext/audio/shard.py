@@ -0,0 +1,797 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import discord
+
+from concord.ext.audio.connection import ConnectionManager
+from concord.ext.audio.constants import SAMPLES_PER_FRAME
+from concord.ext.audio.engine import MixingEngine, _speak
+from concord.ext.audio.exceptions import AudioExtensionError
+from concord.ext.audio.mixer import default_mixer
+from concord.ext.audio.state import AudioState, _clamp_volume, get_key_id
+from concord.ext.audio.status import AudioStatus
+
+
+log = logging.getLogger(__name__)
+
+
+class _PipeWebSocket:
+    def __init__(self, key_id: int, send: Callable):
+        self._key_id = key_id
+        self._send = send
+
+    async def speak(self, state: bool = True):
+        self._send(("speak", self._key_id, bool(state)))
+
+
+class _PipeVoiceClient(discord.VoiceClient):
+    """Stand-in voice client, that passes packets to the main process.
+
+    The real connection is owned by the main process, so only the parts of
+    voice client, used by the audio state and the mixing engine, are here.
+    """
+
+    guild = None
+    channel = None
+
+    def __init__(
+        self, key_id: int, loop: asyncio.AbstractEventLoop, send: Callable
+    ):
+        self.loop = loop
+        self.ws = _PipeWebSocket(key_id, send)
+        self.encoder = discord.opus.Encoder()
+        self._key_id = key_id
+        self._send = send
+        self._is_connected = True
+
+    def is_connected(self) -> bool:
+        return self._is_connected
+
+    def play(self, source, *, after=None):
+        raise AudioExtensionError("Worker audio states use mixing engine")
+
+    def stop(self):
+        pass
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    async def disconnect(self, *, force: bool = False):
+        self._is_connected = False
+
+    def send_audio_packet(self, data, *, encode: bool = True):
+        if encode:
+            data = self.encoder.encode(data, SAMPLES_PER_FRAME)
+        self._send(("packet", self._key_id, bytes(data)))
+
+
+class _WorkerRuntime:
+    def __init__(self, connection, engine_threads: int, options: dict):
+        self._connection = connection
+        self._send_lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._engine = MixingEngine(threads=engine_threads)
+        self._options = options
+        self._audio_states = {}
+        self._sources = {}
+
+    def send(self, message: tuple):
+        # Packets are sent from the mixing threads.
+        with self._send_lock:
+            try:
+                self._connection.send(message)
+            except (EOFError, OSError):
+                pass
+
+    def run(self):
+        threading.Thread(target=self._receive, daemon=True).start()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._engine.stop()
+
+    def _receive(self):
+        while True:
+            try:
+                message = self._connection.recv()
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            self._loop.call_soon_threadsafe(self._handle, message)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _handle(self, message: tuple):
+        kind, command_id, key_id, *args = message
+        try:
+            getattr(self, f"_on_{kind}")(key_id, *args)
+        except Exception as exception:
+            try:
+                self.send(("done", command_id, exception))
+            except Exception:
+                self.send(("done", command_id, RuntimeError(repr(exception))))
+        else:
+            self.send(("done", command_id, None))
+
+    def _on_connect(self, key_id: int, master_volume: float):
+        audio_state = self._audio_states.get(key_id)
+        if audio_state is None:
+            audio_state = self._audio_states[key_id] = AudioState(
+                key_id,
+                mixer=default_mixer(),
+                engine=self._engine,
+                **self._options,
+            )
+        audio_state.set_voice_client(
+            _PipeVoiceClient(key_id, self._loop, self.send)
+        )
+        audio_state.master_volume = master_volume
+
+    def _on_disconnect(self, key_id: int, reason: str):
+        audio_state = self._audio_states.pop(key_id)
+        audio_state._on_end(reason=AudioStatus[reason])
+        audio_state.remove_voice_client()
+
+    def _on_add(self, key_id: int, handle: int, factory: Callable, kwargs):
+        source = factory()
+        self._audio_states[key_id].add_source(
+            source,
+            finalizer=lambda source, reason: self._finalize(
+                key_id, handle, source, reason
+            ),
+            **kwargs,
+        )
+        self._sources[(key_id, handle)] = source
+
+    def _on_remove(self, key_id: int, handle: int):
+        source = self._sources[(key_id, handle)]
+        self._audio_states[key_id].remove_source(source)
+
+    def _on_volume(self, key_id: int, handle: int, volume: float):
+        source = self._sources[(key_id, handle)]
+        self._audio_states[key_id].set_source_volume(source, volume)
+
+    def _on_master_volume(self, key_id: int, volume: float):
+        self._audio_states[key_id].master_volume = volume
+
+    def _finalize(self, key_id: int, handle: int, source, reason):
+        self._sources.pop((key_id, handle), None)
+        try:
+            source.cleanup()
+        except Exception:
+            log.exception("Exception while cleaning up audio source")
+        self.send(("finalized", key_id, handle, reason.name))
+
+
+def _run_worker(connection, engine_threads: int, options: dict):
+    _WorkerRuntime(connection, engine_threads, options).run()
+
+
+class _Shard:
+    """Worker process and its connection.
+
+    Attributes:
+        index: Index of the worker.
+        process: Worker process.
+        connection: Connection to the worker process.
+        key_ids: Voice client key IDs of audio states, owned by the worker.
+        is_alive: Is worker is considered alive.
+        _lock: Lock for sending messages.
+    """
+
+    __slots__ = (
+        "index",
+        "process",
+        "connection",
+        "key_ids",
+        "is_alive",
+        "_lock",
+    )
+
+    def __init__(self, index: int, process, connection):
+        self.index = index
+        self.process = process
+        self.connection = connection
+        self.key_ids = set()
+        self.is_alive = True
+        self._lock = threading.Lock()
+
+    def send(self, message: Optional[tuple]):
+        with self._lock:
+            self.connection.send(message)
+
+
+class _RemoteSource:
+    __slots__ = ("factory", "finalizer", "volume", "options")
+
+    def __init__(self, factory, finalizer, volume, options):
+        self.factory = factory
+        self.finalizer = finalizer
+        self.volume = volume
+        self.options = options
+
+
+class RemoteAudioState:
+    """Audio state, that is owned by the worker process.
+
+    It has the same purpose as :class:`AudioState`, but mixing and encoding
+    are done by the worker process, and packets are sent to the voice client
+    in the main process. Audio sources are created in the worker process by
+    picklable factories, and identified by handles.
+
+    Control methods return futures, which are resolved, when worker has
+    applied the change. They can be awaited in the loop with
+    :func:`asyncio.wrap_future`. Audio state is changed only if the change is
+    applied successfully, so it can be restored on another worker, if worker
+    dies.
+
+    Finalizers are called in the loop with the handle and the reason.
+
+    It can be used by the audio middlewares instead of :class:`AudioState`.
+
+    Args:
+        sharded_state: Sharded state, that owns audio state.
+        key_id: The voice client key ID this state is associated to.
+
+    Attributes:
+        _sharded_state: Sharded state, that owns audio state.
+        _key_id: The voice client key ID this state is associated to.
+        _voice_client: Voice client instance.
+        _voice_client_disconnect_source: The source ``disconnect`` method of
+            voice client.
+        _master_volume: Master volume for all audio sources.
+        _sources: Audio sources by their handles.
+    """
+
+    _sharded_state: "ShardedState"
+    _key_id: int
+    _voice_client: Optional[discord.VoiceClient]
+    _voice_client_disconnect_source: Optional[Callable]
+    _master_volume: float
+    _sources: Dict[int, _RemoteSource]
+
+    def __init__(self, sharded_state: "ShardedState", key_id: int):
+        self._sharded_state = sharded_state
+        self._key_id = key_id
+        self._voice_client = None
+        self._voice_client_disconnect_source = None
+        self._master_volume = 1.0
+        self._sources = {}
+
+    @property
+    def voice_client(self) -> Optional[discord.VoiceClient]:
+        """Voice client of the state."""
+        return self._voice_client
+
+    @property
+    def master_volume(self) -> float:
+        """Master volume for all audio sources.
+
+        Value is a float and can be from 0.0 to 2.0. New value is sent to the
+        worker without waiting, use :meth:`set_master_volume` to wait for it.
+        """
+        return self._master_volume
+
+    @master_volume.setter
+    def master_volume(self, value: float):
+        # Worker gets the volume on connect, if voice client is not set yet.
+        self._master_volume = _clamp_volume(value)
+        if self._voice_client is not None:
+            self._sharded_state._command(
+                self, "master_volume", self._master_volume
+            )
+
+    @property
+    def sources(self) -> List[int]:
+        """Handles of audio sources."""
+        return list(self._sources)
+
+    async def connect(
+        self, channel: discord.abc.Connectable
+    ) -> discord.VoiceClient:
+        """Connect to the voice channel and set voice client to the state.
+
+        Connection manager of the sharded state is used, so connects are
+        limited, retried and coalesced.
+
+        Args:
+            channel: Channel to connect to.
+
+        Returns:
+            Connected voice client.
+
+        Raises:
+            asyncio.TimeoutError: If connect has timed out.
+        """
+        connection_manager = self._sharded_state.connection_manager
+        voice_client = await connection_manager.connect(channel)
+        await asyncio.wrap_future(
+            self.set_voice_client(voice_client), loop=self._sharded_state._loop
+        )
+        return voice_client
+
+    def set_voice_client(
+        self, voice_client: discord.VoiceClient
+    ) -> concurrent.futures.Future:
+        """Set new voice client to the state.
+
+        Audio state is created on the least loaded worker.
+
+        Args:
+            voice_client: Voice client to set.
+
+        Raises:
+            ValueError: If not a :class:`discord.VoiceClient` provided, or voice
+                client is not connected.
+        """
+        if not isinstance(voice_client, discord.VoiceClient):
+            raise ValueError("Not a voice client")
+        if voice_client == self._voice_client:
+            future = concurrent.futures.Future()
+            future.set_result(None)
+            return future
+        if not voice_client.is_connected():
+            raise ValueError("Voice client is not connected")
+        if self._voice_client is not None:
+            self.remove_voice_client()
+
+        future = self._sharded_state._connect(self)
+        self._voice_client = voice_client
+        self._voice_client_disconnect_source = voice_client.disconnect
+        voice_client.disconnect = self._on_disconnect
+        return future
+
+    def remove_voice_client(self) -> Optional[concurrent.futures.Future]:
+        """Removes voice client from the state.
+
+        All audio sources will be immediately finished.
+        """
+        return self._remove_voice_client(AudioStatus.VOICE_CLIENT_REMOVED)
+
+    def _remove_voice_client(
+        self, reason: AudioStatus
+    ) -> Optional[concurrent.futures.Future]:
+        if self._voice_client is None:
+            return None
+
+        self._voice_client.disconnect = self._voice_client_disconnect_source
+        self._voice_client_disconnect_source = None
+        self._voice_client = None
+        return self._sharded_state._disconnect(self, reason)
+
+    async def _on_disconnect(self, *args, **kwargs):
+        await self._voice_client_disconnect_source(*args, **kwargs)
+        self._remove_voice_client(AudioStatus.VOICE_CLIENT_DISCONNECTED)
+
+    def add_source(
+        self,
+        factory: Callable[[], discord.AudioSource],
+        *,
+        finalizer: Optional[Callable] = None,
+        volume: float = 1.0,
+        **options,
+    ) -> concurrent.futures.Future:
+        """Add audio source, created by the worker process.
+
+        Args:
+            factory: Picklable callable, that returns audio source. It is
+                called in the worker process, and called again, if audio state
+                is moved to another worker.
+            finalizer: The finalizer that will be called with the handle and
+                the reason, when source is removed.
+            volume: Volume of the audio source.
+            **options: Other options of :meth:`AudioState.add_source`, like
+                ``prefetch`` or ``input_format``.
+
+        Returns:
+            Future with the handle of the audio source.
+
+        Raises:
+            concord.ext.audio.exceptions.AudioExtensionError: If voice client is
+                not present.
+        """
+        if self._voice_client is None:
+            raise AudioExtensionError("Voice client is not present")
+        source = _RemoteSource(
+            factory, finalizer, _clamp_volume(volume), options
+        )
+        return self._sharded_state._add_source(self, source)
+
+    def remove_source(self, handle: int) -> concurrent.futures.Future:
+        """Remove audio source.
+
+        Args:
+            handle: Handle of the audio source.
+
+        Raises:
+            KeyError: If source is not present.
+        """
+        if handle not in self._sources:
+            raise KeyError(handle)
+        return self._sharded_state._command(self, "remove", handle)
+
+    def set_source_volume(
+        self, handle: int, volume: float
+    ) -> concurrent.futures.Future:
+        """Set volume of the audio source.
+
+        Args:
+            handle: Handle of the audio source.
+            volume: New volume. Value is a float and can be from 0.0 to 2.0.
+
+        Raises:
+            KeyError: If source is not present.
+        """
+        source = self._sources.get(handle)
+        if source is None:
+            raise KeyError(handle)
+        volume = _clamp_volume(volume)
+
+        def on_done(future):
+            if future.exception() is None:
+                source.volume = volume
+
+        future = self._sharded_state._command(self, "volume", handle, volume)
+        future.add_done_callback(on_done)
+        return future
+
+    def set_master_volume(self, volume: float) -> concurrent.futures.Future:
+        """Set master volume for all audio sources.
+
+        Args:
+            volume: New volume. Value is a float and can be from 0.0 to 2.0.
+        """
+        volume = _clamp_volume(volume)
+
+        def on_done(future):
+            if future.exception() is None:
+                self._master_volume = volume
+
+        future = self._sharded_state._command(self, "master_volume", volume)
+        future.add_done_callback(on_done)
+        return future
+
+    def _on_finalized(self, handle: int, reason: AudioStatus):
+        source = self._sources.pop(handle, None)
+        if source is None or source.finalizer is None:
+            return
+        try:
+            source.finalizer(handle, reason)
+        except Exception:
+            log.exception("Exception while finalizing audio source")
+
+
+class ShardedState:
+    """Sharded front-end of the audio state storage.
+
+    Audio states are distributed over the local worker processes, which do
+    the mixing and the encoding, so mixing is not limited by the single
+    process. Voice clients are kept in the main process, and encoded packets
+    are sent to them from the worker processes.
+
+    Each voice client key is assigned to the least loaded worker, when voice
+    client is set. If worker dies, its audio states are moved to other
+    workers: voice clients are set again and audio sources are recreated by
+    their factories, so they start from the beginning.
+
+    Args:
+        workers: Amount of worker processes.
+        engine_threads: Amount of threads of the mixing engine in each
+            worker.
+        start_method: Start method of worker processes.
+        loop: Loop, where futures are resolved and finalizers are called. If
+            not provided, the current event loop is used.
+        connection_manager: Manager of voice connections, shared by audio
+            states. If not provided, the default one is created.
+        **options: Options of :class:`AudioState`, like ``idle_timeout`` or
+            ``block_frames``.
+
+    Attributes:
+        _shards: Worker processes.
+        _audio_states: Audio states by voice client key ID.
+        _assignments: Workers by voice client key ID.
+        _futures: Futures of the commands, sent to workers, by command ID.
+        _command_ids: Counter of command IDs.
+        _handles: Counter of audio source handles.
+        _loop: Loop, where futures are resolved and finalizers are called.
+        _connection_manager: Manager of voice connections.
+    """
+
+    _shards: List[_Shard]
+    _audio_states: Dict[int, RemoteAudioState]
+    _assignments: Dict[int, _Shard]
+    _futures: Dict[int, tuple]
+    _command_ids: Any
+    _handles: Any
+    _loop: asyncio.AbstractEventLoop
+    _connection_manager: ConnectionManager
+
+    def __init__(
+        self,
+        *,
+        workers: int = 2,
+        engine_threads: int = 2,
+        start_method: str = "spawn",
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        connection_manager: Optional[ConnectionManager] = None,
+        **options,
+    ):
+        if workers < 1:
+            raise ValueError("Amount of workers should be positive")
+
+        self._audio_states = {}
+        self._assignments = {}
+        self._futures = {}
+        self._command_ids = itertools.count()
+        self._handles = itertools.count(1)
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._connection_manager = (
+            connection_manager
+            if connection_manager is not None
+            else ConnectionManager()
+        )
+
+        context = multiprocessing.get_context(start_method)
+        self._shards = []
+        for index in range(workers):
+            connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=_run_worker,
+                args=(child_connection, engine_threads, options),
+                name=f"audio-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            child_connection.close()
+
+            shard = _Shard(index, process, connection)
+            self._shards.append(shard)
+            threading.Thread(
+                target=self._receive, args=(shard,), daemon=True
+            ).start()
+
+    def __len__(self) -> int:
+        return len(self._audio_states)
+
+    @property
+    def connection_manager(self) -> ConnectionManager:
+        """Manager of voice connections."""
+        return self._connection_manager
+
+    @property
+    def workers(self) -> int:
+        """Amount of alive workers."""
+        return sum(shard.is_alive for shard in self._shards)
+
+    def get_audio_state(
+        self, voice_client_source: Union[discord.Guild, discord.abc.Connectable]
+    ) -> RemoteAudioState:
+        """Returns audio state for given voice client source.
+
+        Args:
+            voice_client_source: The source, by which voice client can be
+                identified (where voice client is in using) and audio state can
+                be found.
+
+        Returns:
+            Audio state instance.
+        """
+        key_id = get_key_id(voice_client_source)
+        audio_state = self._audio_states.get(key_id)
+        if audio_state is None:
+            audio_state = self._audio_states[key_id] = RemoteAudioState(
+                self, key_id
+            )
+        return audio_state
+
+    def get_worker(self, key_id: int) -> Optional[int]:
+        """Returns index of the worker, that owns audio state, if any."""
+        shard = self._assignments.get(key_id)
+        return shard.index if shard is not None else None
+
+    def close(self):
+        """Stop worker processes.
+
+        All audio states are finished.
+        """
+        for audio_state in list(self._audio_states.values()):
+            audio_state.remove_voice_client()
+        for shard in self._shards:
+            shard.is_alive = False
+            try:
+                shard.send(None)
+            except (EOFError, OSError):
+                pass
+        for shard in self._shards:
+            shard.process.join(timeout=5)
+
+    def _connect(
+        self, audio_state: RemoteAudioState
+    ) -> concurrent.futures.Future:
+        shards = [shard for shard in self._shards if shard.is_alive]
+        if len(shards) == 0:
+            raise AudioExtensionError("There are no alive workers")
+
+        shard = self._assignments.get(audio_state._key_id)
+        if shard is None:
+            shard = min(shards, key=lambda shard: len(shard.key_ids))
+            shard.key_ids.add(audio_state._key_id)
+            self._assignments[audio_state._key_id] = shard
+        return self._command(audio_state, "connect", audio_state._master_volume)
+
+    def _disconnect(
+        self, audio_state: RemoteAudioState, reason: AudioStatus
+    ) -> concurrent.futures.Future:
+        if audio_state._key_id not in self._assignments:
+            # Audio state was owned by the died worker.
+            future = concurrent.futures.Future()
+            future.set_result(None)
+            return future
+        future = self._command(audio_state, "disconnect", reason.name)
+        shard = self._assignments.pop(audio_state._key_id)
+        shard.key_ids.discard(audio_state._key_id)
+        return future
+
+    def _add_source(
+        self, audio_state: RemoteAudioState, source: _RemoteSource
+    ) -> concurrent.futures.Future:
+        handle = next(self._handles)
+        result = concurrent.futures.Future()
+
+        def on_done(future):
+            exception = future.exception()
+            if exception is not None:
+                result.set_exception(exception)
+                return
+            audio_state._sources[handle] = source
+            result.set_result(handle)
+
+        self._command(
+            audio_state,
+            "add",
+            handle,
+            source.factory,
+            {"volume": source.volume, **source.options},
+        ).add_done_callback(on_done)
+        return result
+
+    def _command(
+        self, audio_state: RemoteAudioState, kind: str, *args
+    ) -> concurrent.futures.Future:
+        shard = self._assignments.get(audio_state._key_id)
+        if shard is None:
+            raise AudioExtensionError("Voice client is not present")
+
+        future = concurrent.futures.Future()
+        command_id = next(self._command_ids)
+        self._futures[command_id] = (future, shard)
+        try:
+            shard.send((kind, command_id, audio_state._key_id, *args))
+        except (EOFError, OSError) as exception:
+            self._futures.pop(command_id)
+            future.set_exception(
+                AudioExtensionError(f"Worker has died: {exception}")
+            )
+        return future
+
+    def _receive(self, shard: _Shard):
+        while True:
+            try:
+                message = shard.connection.recv()
+            except (EOFError, OSError):
+                break
+
+            if message[0] == "packet":
+                self._send_packet(*message[1:])
+            elif message[0] == "speak":
+                audio_state = self._audio_states.get(message[1])
+                if audio_state is not None and audio_state.voice_client:
+                    _speak(audio_state.voice_client, message[2])
+            else:
+                # Order of results and finalizers is kept in the loop.
+                self._loop.call_soon_threadsafe(self._handle, message)
+
+        if shard.is_alive:
+            self._loop.call_soon_threadsafe(self._on_worker_death, shard)
+
+    def _send_packet(self, key_id: int, packet: bytes):
+        audio_state = self._audio_states.get(key_id)
+        voice_client = audio_state.voice_client if audio_state else None
+        if voice_client is None or not voice_client.is_connected():
+            return
+        try:
+            voice_client.send_audio_packet(packet, encode=False)
+        except Exception:
+            log.exception("Exception while sending audio packet")
+
+    def _handle(self, message: tuple):
+        if message[0] == "done":
+            _, command_id, exception = message
+            future, _ = self._futures.pop(command_id)
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(None)
+        elif message[0] == "finalized":
+            _, key_id, handle, reason = message
+            audio_state = self._audio_states.get(key_id)
+            if audio_state is not None:
+                audio_state._on_finalized(handle, AudioStatus[reason])
+
+    def _on_worker_death(self, shard: _Shard):
+        shard.is_alive = False
+        log.error(f"Audio worker #{shard.index} has died, rebalancing")
+
+        for command_id, (future, owner) in list(self._futures.items()):
+            if owner is shard:
+                del self._futures[command_id]
+                future.set_exception(AudioExtensionError("Worker has died"))
+
+        key_ids, shard.key_ids = shard.key_ids, set()
+        for key_id in key_ids:
+            del self._assignments[key_id]
+            audio_state = self._audio_states[key_id]
+            try:
+                self._restore(audio_state)
+            except AudioExtensionError:
+                log.exception("Unable to restore audio state")
+                audio_state._remove_voice_client(
+                    AudioStatus.VOICE_CLIENT_REMOVED
+                )
+                for handle in list(audio_state._sources):
+                    audio_state._on_finalized(
+                        handle, AudioStatus.VOICE_CLIENT_REMOVED
+                    )
+
+    def _restore(self, audio_state: RemoteAudioState):
+        self._connect(audio_state)
+        # Handles are kept, so the caller can still control audio sources.
+        for handle, source in list(audio_state._sources.items()):
+            self._command(
+                audio_state,
+                "add",
+                handle,
+                source.factory,
+                {"volume": source.volume, **source.options},
+            ).add_done_callback(
+                lambda future, handle=handle: self._on_restore_failed(
+                    audio_state, handle, future
+                )
+            )
+
+    def _on_restore_failed(self, audio_state, handle: int, future):
+        if future.exception() is None:
+            return
+        log.error("Unable to restore audio source", exc_info=future.exception())
+        audio_state._on_finalized(handle, AudioStatus.SOURCE_REMOVED)
@@ -0,0 +1,158 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Union
+
+import discord
+
+from concord.ext.audio.constants import FRAME_LENGTH
+from concord.ext.audio.formats import NATIVE_FORMAT, AudioFormat
+
+
+log = logging.getLogger(__name__)
+
+#: Version of the snapshot format.
+SNAPSHOT_VERSION = 1
+
+#: Callable, that recreates audio source from its descriptor and position in
+#: seconds.
+Resolver = Callable[[Dict[str, Any], float], discord.AudioSource]
+
+
+class ResumableSource(discord.AudioSource):
+    """Audio source wrapper, that can be resumed after restart.
+
+    It tracks the position of the original audio source, so it can be saved
+    in a snapshot with the descriptor and recreated from this position
+    later. Descriptor should be JSON-serializable and contain enough data for
+    the resolver to recreate the audio source, like its URL.
+
+    Args:
+        original: Audio source to track.
+        descriptor: JSON-serializable description of the audio source. Its
+            ``type`` key selects the resolver on restore.
+        position: Time in seconds, from which original audio source starts.
+        input_format: Format of PCM, returned by original audio source. It is
+            used for calculating the position.
+
+    Attributes:
+        original: Audio source to track.
+        descriptor: JSON-serializable description of the audio source.
+        input_format: Format of PCM, returned by original audio source.
+        _position: Time in seconds, from which original audio source starts.
+        _bytes: Amount of read bytes.
+        _packets: Amount of read Opus packets.
+        _bytes_per_second: Amount of bytes per second of PCM.
+    """
+
+    original: discord.AudioSource
+    descriptor: Dict[str, Any]
+    input_format: AudioFormat
+
+    _position: float
+    _bytes: int
+    _packets: int
+    _bytes_per_second: int
+
+    def __init__(
+        self,
+        original: discord.AudioSource,
+        descriptor: Dict[str, Any],
+        *,
+        position: float = 0.0,
+        input_format: AudioFormat = NATIVE_FORMAT,
+    ):
+        if not isinstance(original, discord.AudioSource):
+            raise ValueError("Not an audio source")
+        if "type" not in descriptor:
+            raise ValueError("Descriptor should have a type")
+
+        self.original = original
+        self.descriptor = descriptor
+        self.input_format = input_format
+        self._position = position
+        self._bytes = 0
+        self._packets = 0
+        self._bytes_per_second = (
+            input_format.sampling_rate * input_format.frame_width
+        )
+
+    @property
+    def position(self) -> float:
+        """Current position in seconds."""
+        return (
+            self._position
+            + self._bytes / self._bytes_per_second
+            + self._packets * FRAME_LENGTH / 1000
+        )
+
+    def is_opus(self) -> bool:  # noqa: D102
+        return self.original.is_opus()
+
+    def read(self) -> bytes:  # noqa: D102
+        data = self.original.read()
+        if self.original.is_opus():
+            if len(data) > 0:
+                self._packets += 1
+        else:
+            self._bytes += len(data)
+        return data
+
+    def cleanup(self):  # noqa: D102
+        self.original.cleanup()
+
+
+def write_snapshot(path: Union[str, os.PathLike], audio_states: list):
+    """Write snapshot of audio states to the file atomically.
+
+    Args:
+        path: Path to the file.
+        audio_states: Snapshots of audio states.
+    """
+    data = {"version": SNAPSHOT_VERSION, "audio_states": audio_states}
+    temporary = f"{os.fspath(path)}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(data, file, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+def read_snapshot(path: Union[str, os.PathLike]) -> list:
+    """Read snapshot of audio states from the file.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        Snapshots of audio states.
+
+    Raises:
+        ValueError: If snapshot has unsupported version.
+    """
+    with open(path) as file:
+        data = json.load(file)
+    if data.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("Unsupported version of the snapshot")
+    return data["audio_states"]
@@ -22,27 +22,392 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 import asyncio
-import audioop
-import enum
+import collections
+import concurrent.futures
 import functools
 import logging
-from typing import Callable, Dict, Optional, Union
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Union
 
 import discord
 
+from concord.ext.audio.broadcast import Broadcast
+from concord.ext.audio.buffer import MixBlock
+from concord.ext.audio.constants import (
+    FRAME_LENGTH,
+    FRAME_SIZE,
+    OPUS_SILENCE,
+    SILENCE,
+)
+from concord.ext.audio.connection import ConnectionManager
+from concord.ext.audio.engine import MixingEngine
 from concord.ext.audio.exceptions import AudioExtensionError
+from concord.ext.audio.formats import (
+    NATIVE_FORMAT,
+    AudioFormat,
+    ConvertingSource,
+    OpusDecodingSource,
+)
+from concord.ext.audio.metrics import AudioStateMetrics, SourceMetrics
+from concord.ext.audio.mixer import Mixer, default_mixer
+from concord.ext.audio.prefetch import PrefetchSource
+from concord.ext.audio.process import ProcessSource
+from concord.ext.audio.queue import Track, TrackQueue
+from concord.ext.audio.registry import SourceEntry, SourceRegistry
+from concord.ext.audio.snapshot import (
+    Resolver,
+    ResumableSource,
+    read_snapshot,
+    write_snapshot,
+)
+from concord.ext.audio.status import AudioStatus, PlayerStatus
 
 
 log = logging.getLogger(__name__)
 
 
+def get_key_id(
+    voice_client_source: Union[discord.Guild, discord.abc.Connectable]
+) -> Optional[int]:
+    """Returns voice client key ID for given voice client source.
+
+    Args:
+        voice_client_source: The source, by which voice client can be
+            identified.
+
+    Returns:
+        Voice client key ID, or ``None``, if source is not supported.
+    """
+    if isinstance(voice_client_source, discord.Guild):
+        return voice_client_source.id
+    if isinstance(voice_client_source, discord.abc.Connectable):
+        key_id, _ = voice_client_source._get_voice_client_key()
+        return key_id
+    return None
+
+
+def _clamp_volume(value: float) -> float:
+    return float(max(min(value, 2.0), 0.0))
+
+
 class State:
-    """Global state with guild's audio states."""
+    """Global state with guild's audio states.
+
+    Args:
+        mixer_factory: Callable, that returns a new mixer for each audio state.
+        engine_threads: Amount of threads of the shared mixing engine. If
+            provided, all audio states are ticked by the engine instead of
+            separate player thread for each voice client.
+        idle_timeout: Time in seconds, after which audio states without audio
+            sources are suspended.
+        collect_metrics: Should audio states collect real-time metrics.
+        metrics_callback: The callback that will be called periodically with
+            audio state and its metrics, if metrics are collected. Useful for
+            exporting metrics. It is called in the loop.
+        metrics_interval: Interval in seconds between callback calls.
+        max_audio_states: Maximum amount of audio states to keep. If exceeded,
+            least recently used idle audio states are evicted.
+        audio_state_ttl: Time in seconds, after which idle audio state is
+            evicted, if not used.
+        queue_lead_time: Time in seconds before the end of the queued track,
+            when the next one is warmed up.
+        block_frames: Amount of frames, that audio states mix at once. See
+            :attr:`AudioState.block_frames` for details.
+        connection_manager: Manager of voice connections, shared by audio
+            states. If not provided, manager with default limits is created.
+        source_budget: Time in seconds, that one read of audio source may
+            take. See :class:`AudioState` for details.
+        budget_strikes: Amount of budget violations, after which audio
+            source is demoted or removed.
+        budget_window: Amount of frames, within which ``budget_strikes``
+            underruns of prefetched audio source remove it. See
+            :class:`AudioState` for details.
+
+    Audio state is idle, if it has no voice client and no audio sources.
+    Evicted audio states are recreated on the next access.
+
+    Attributes:
+        _audio_states: Audio states by voice client key ID, in order of access.
+        _accessed: Time of the last access of each audio state.
+        _mixer_factory: Callable, that returns a new mixer for each audio state.
+        _engine: Shared mixing engine, if used.
+        _idle_timeout: Time in seconds, after which audio states without audio
+            sources are suspended.
+        _collect_metrics: Should audio states collect real-time metrics.
+        _metrics_callback: The callback for exporting metrics.
+        _metrics_interval: Interval in seconds between callback calls.
+        _max_audio_states: Maximum amount of audio states to keep.
+        _audio_state_ttl: Time in seconds, after which idle audio state is
+            evicted.
+        _last_eviction: Time of the last eviction of expired audio states.
+        _queue_lead_time: Time in seconds before the end of the queued track,
+            when the next one is warmed up.
+        _block_frames: Amount of frames, that audio states mix at once.
+        _broadcasts: Broadcasts by their names.
+        _connection_manager: Manager of voice connections.
+        _source_budget: Time in seconds, that one read of audio source may
+            take.
+        _budget_strikes: Amount of budget violations, after which audio
+            source is demoted or removed.
+        _budget_window: Amount of frames, within which underruns of
+            prefetched audio source are counted.
+    """
 
     _audio_states: Dict[int, "AudioState"]
+    _accessed: Dict[int, float]
+    _mixer_factory: Callable[[], Mixer]
+    _engine: Optional[MixingEngine]
+    _idle_timeout: float
+    _collect_metrics: bool
+    _metrics_callback: Optional[Callable]
+    _metrics_interval: float
+    _max_audio_states: Optional[int]
+    _audio_state_ttl: Optional[float]
+    _last_eviction: float
+    _queue_lead_time: float
+    _block_frames: int
+    _broadcasts: Dict[str, Broadcast]
+    _connection_manager: ConnectionManager
+    _source_budget: Optional[float]
+    _budget_strikes: int
+    _budget_window: int
+
+    def __init__(
+        self,
+        *,
+        mixer_factory: Callable[[], Mixer] = default_mixer,
+        engine_threads: Optional[int] = None,
+        idle_timeout: float = 1.0,
+        collect_metrics: bool = False,
+        metrics_callback: Optional[Callable] = None,
+        metrics_interval: float = 10.0,
+        max_audio_states: Optional[int] = None,
+        audio_state_ttl: Optional[float] = None,
+        queue_lead_time: float = 5.0,
+        block_frames: int = 1,
+        connection_manager: Optional[ConnectionManager] = None,
+        source_budget: Optional[float] = None,
+        budget_strikes: int = 3,
+        budget_window: int = 50,
+    ):
+        self._audio_states = collections.OrderedDict()
+        self._accessed = {}
+        self._mixer_factory = mixer_factory
+        self._idle_timeout = idle_timeout
+        self._collect_metrics = collect_metrics
+        self._metrics_callback = metrics_callback
+        self._metrics_interval = metrics_interval
+        self._max_audio_states = max_audio_states
+        self._audio_state_ttl = audio_state_ttl
+        self._last_eviction = time.monotonic()
+        self._queue_lead_time = queue_lead_time
+        self._block_frames = block_frames
+        self._broadcasts = {}
+        self._source_budget = source_budget
+        self._budget_strikes = budget_strikes
+        self._budget_window = budget_window
+        self._connection_manager = (
+            connection_manager
+            if connection_manager is not None
+            else ConnectionManager()
+        )
+        self._engine = (
+            MixingEngine(threads=engine_threads)
+            if engine_threads is not None
+            else None
+        )
+
+    @property
+    def engine(self) -> Optional[MixingEngine]:
+        """Shared mixing engine, if used."""
+        return self._engine
+
+    @property
+    def connection_manager(self) -> ConnectionManager:
+        """Manager of voice connections."""
+        return self._connection_manager
+
+    def __len__(self) -> int:
+        return len(self._audio_states)
+
+    def add_broadcast(
+        self, name: str, source: discord.AudioSource, *, depth: int = 50
+    ) -> Broadcast:
+        """Register audio source, that should be played in many audio states.
+
+        Audio source is decoded once for all audio states, which play it. Add
+        subscriber of the broadcast to each audio state, that should play it::
+
+            broadcast = state.get_broadcast("radio")
+            audio_state.add_source(broadcast.subscribe())
+
+        Args:
+            name: Name of the broadcast.
+            source: Audio source to broadcast.
+            depth: Amount of the last frames to keep for lagging subscribers.
+
+        Returns:
+            Registered broadcast.
+
+        Raises:
+            ValueError: If broadcast with the same name is already present.
+            discord.opus.OpusNotLoaded: If Opus audio source is provided, but
+                libopus, needed for decoding it, is not loaded.
+        """
+        if name in self._broadcasts:
+            raise ValueError("Broadcast is already present")
+        broadcast = self._broadcasts[name] = Broadcast(source, depth=depth)
+        return broadcast
+
+    def get_broadcast(self, name: str) -> Optional[Broadcast]:
+        """Returns broadcast by its name, if present."""
+        return self._broadcasts.get(name)
+
+    def remove_broadcast(self, name: str):
+        """Remove and close the broadcast.
+
+        Subscribers end after the frames, that are already decoded.
+
+        Args:
+            name: Name of the broadcast.
+
+        Raises:
+            KeyError: If broadcast is not present.
+        """
+        self._broadcasts.pop(name).close()
+
+    def save_snapshot(self, path: Union[str, os.PathLike]) -> int:
+        """Save snapshot of connected audio states to the file.
+
+        Snapshot contains voice channels, master volumes, resumable audio
+        sources and queued tracks with their positions, so playback can be
+        resumed after restart with :meth:`restore_snapshot`. See
+        :meth:`AudioState.get_snapshot` for details.
+
+        Args:
+            path: Path to the file. It is replaced atomically.
+
+        Returns:
+            Amount of saved audio states.
+        """
+        snapshots = [
+            snapshot
+            for snapshot in (
+                audio_state.get_snapshot()
+                for audio_state in self._audio_states.values()
+            )
+            if snapshot is not None
+        ]
+        write_snapshot(path, snapshots)
+        return len(snapshots)
+
+    async def restore_snapshot(
+        self,
+        path: Union[str, os.PathLike],
+        client: discord.Client,
+        resolvers: Dict[str, Resolver],
+    ) -> int:
+        """Restore audio states from the snapshot file.
+
+        Audio states are restored in parallel, and amount of simultaneous
+        connects is limited by the connection manager.
+
+        Args:
+            path: Path to the file.
+            client: Client for finding voice channels.
+            resolvers: Callables, that recreate audio sources from their
+                descriptors and positions, by the descriptor type.
+
+        Returns:
+            Amount of restored audio states.
+
+        Raises:
+            ValueError: If snapshot has unsupported version.
+        """
+        snapshots = read_snapshot(path)
+
+        async def restore(snapshot: dict) -> bool:
+            channel = client.get_channel(snapshot["channel_id"])
+            if not isinstance(channel, discord.abc.Connectable):
+                log.warning(
+                    f"Voice channel of the snapshot is not found (Voice "
+                    f"client key ID #{snapshot['key_id']})"
+                )
+                return False
+            audio_state = self.get_audio_state(channel)
+            await audio_state.restore_snapshot(channel, snapshot, resolvers)
+            return True
+
+        results = await asyncio.gather(
+            *(restore(snapshot) for snapshot in snapshots),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                log.error("Unable to restore audio state", exc_info=result)
+        return sum(result is True for result in results)
+
+    def evict(self, *, limit: Optional[int] = None) -> int:
+        """Evict idle audio states.
+
+        Audio states, that are not used for the configured TTL, are evicted.
+        Then, least recently used idle audio states are evicted, until amount
+        of audio states fits the limit.
+
+        It is called automatically on :meth:`get_audio_state`, but can be
+        called manually as well.
+
+        Args:
+            limit: Maximum amount of audio states to keep. If not provided,
+                configured one is used.
+
+        Returns:
+            Amount of evicted audio states.
+        """
+        now = time.monotonic()
+        ttl = self._audio_state_ttl
+        if limit is None:
+            limit = self._max_audio_states
+        self._last_eviction = now
+
+        evicted = []
+        excess = len(self._audio_states) - limit if limit is not None else 0
+
+        for key_id, audio_state in self._audio_states.items():
+            if not audio_state.is_idle:
+                continue
+            if excess > 0:
+                excess -= 1
+            elif ttl is None or now - self._accessed[key_id] < ttl:
+                continue
+            evicted.append(key_id)
+
+        for key_id in evicted:
+            del self._audio_states[key_id]
+            del self._accessed[key_id]
+
+        if len(evicted) > 0:
+            log.debug(f"{len(evicted)} idle audio states have evicted")
+        return len(evicted)
 
-    def __init__(self):
-        self._audio_states = {}
+    def metrics(self) -> Dict[int, Dict[str, Any]]:
+        """Returns metrics of all audio states.
+
+        Returns:
+            Metrics by voice client key ID. Audio states without collected
+            metrics are omitted. See :meth:`AudioState.get_metrics` for
+            details.
+        """
+        result = {}
+
+        for key_id, audio_state in list(self._audio_states.items()):
+            metrics = audio_state.get_metrics()
+            if metrics is not None:
+                result[key_id] = metrics
+        return result
 
     def get_audio_state(
         self, voice_client_source: Union[discord.Guild, discord.abc.Connectable]
@@ -53,7 +418,7 @@ class State:
         channel, due to it's voice client key is equal to given channel's key.
         Check for connected channel and move to desired one, if needed.
 
-        Audio state will be created, if isn't created yet.
+        Audio state will be created, if isn't created yet, or evicted.
 
         Args:
             voice_client_source: The source, by which voice client can be
@@ -63,36 +428,79 @@ class State:
         Returns:
             Audio state instance.
         """
-        key_id = None
+        key_id = get_key_id(voice_client_source)
 
-        if isinstance(voice_client_source, discord.Guild):
-            key_id = voice_client_source.id
-        elif isinstance(voice_client_source, discord.abc.Connectable):
-            key_id, _ = voice_client_source._get_voice_client_key()
+        now = time.monotonic()
+        if (
+            self._audio_state_ttl is not None
+            and now - self._last_eviction >= self._audio_state_ttl
+        ):
+            self.evict()
 
         audio_state = self._audio_states.get(key_id)
-        if audio_state is None:
-            audio_state = self._audio_states[key_id] = AudioState(key_id)
-
+        if audio_state is not None:
+            self._audio_states.move_to_end(key_id)
+        else:
+            if (
+                self._max_audio_states is not None
+                and len(self._audio_states) >= self._max_audio_states
+            ):
+                self.evict(limit=self._max_audio_states - 1)
+            audio_state = self._audio_states[key_id] = AudioState(
+                key_id,
+                mixer=self._mixer_factory(),
+                engine=self._engine,
+                idle_timeout=self._idle_timeout,
+                collect_metrics=self._collect_metrics,
+                metrics_callback=self._metrics_callback,
+                metrics_interval=self._metrics_interval,
+                queue_lead_time=self._queue_lead_time,
+                block_frames=self._block_frames,
+                connection_manager=self._connection_manager,
+                source_budget=self._source_budget,
+                budget_strikes=self._budget_strikes,
+                budget_window=self._budget_window,
+            )
+
+        self._accessed[key_id] = now
         return audio_state
 
 
-class AudioStatus(enum.Enum):
-    SOURCE_ENDED = enum.auto()
-    SOURCE_CLEANED = enum.auto()
-    SOURCE_REMOVED = enum.auto()
-    VOICE_CLIENT_DISCONNECTED = enum.auto()
-    VOICE_CLIENT_REMOVED = enum.auto()
-
-
 class AudioState(discord.AudioSource):
     """Audio state class.
 
     Contains audio sources, voice client and other connection-related
     information for each active voice connection.
 
+    If the only audio source is playing and it is already encoded with Opus,
+    packets are passed as is, without decoding, mixing and encoding again,
+    unless any volume is applied. Audio state switches back to the mixing on
+    the next frame after another audio source is added.
+
+    When all audio sources have finished, player is not stopped, but sends
+    silence for a while and then suspends, until audio source is added again.
+    Resuming suspended player is cheaper than starting new one.
+
+    Tracks, that should be played one after another, can be added to the queue
+    with :meth:`enqueue`. Queue is played as a single audio source, so it is
+    mixed with other audio sources.
+
+    If per-source budget is set, reads of audio sources, that take longer, are
+    counted as budget violations. After each ``budget_strikes`` violations,
+    audio source is demoted: it is read by the background thread, like with
+    :class:`PrefetchSource`, so it can't delay other audio sources anymore and
+    silence is mixed instead of it, while its frame is not ready. Reads of
+    prefetched audio sources never block, so their underruns are counted as
+    budget violations instead. Audio source, that underruns ``budget_strikes``
+    times within the last ``budget_window`` frames (one second by default)
+    after demotion, or after its first frame, if it has been added with
+    prefetching, is removed with the :attr:`AudioStatus.SOURCE_OVER_BUDGET`
+    reason. So audio source, that keeps up only partially, is removed as
+    well.
+
     .. warning::
-        Public API is not thread safe.
+        Public API is not thread safe. Use :meth:`submit` to control audio
+        state from other threads.
 
     Attributes:
         _key_id: The voice client key ID this state is associated to.
@@ -101,10 +509,73 @@ class AudioState(discord.AudioSource):
             voice client. It's needed due to it will be replaced with a
             listener while voice client is owned by audio state.
         _loop: Loop, where main tasks of audio state should happen.
-        _audio_sources: List of audio sources, with finalizers, if provided.
-        _master_source: Built master source.
+        _audio_sources: Registry of audio sources, with finalizers, if
+            provided.
+        _master_volume: Master volume for all audio sources.
+        _mixer: Mixer backend used for mixing audio sources.
+        _engine: Shared mixing engine, if audio state should be ticked by it
+            instead of the voice client's player.
+        _is_opus_frame: Is the last read frame is an Opus packet.
+        _status: Status of the player.
+        _generation: Counter of started players, to ignore the end of
+            previous ones.
+        _player_lock: Lock for changing player status.
+        _idle_frames: Amount of frames played while being idle.
+        _idle_limit: Amount of idle frames, after which player is suspended.
+        _metrics: Real-time metrics, if collected.
+        _metrics_callback: The callback for exporting metrics.
+        _metrics_period: Amount of frames between callback calls.
+        _ended: Entries of audio sources, that have ended on the current
+            frame.
+        _queue: Queue of tracks, if created.
+        _queue_lead_time: Time in seconds before the end of the queued track,
+            when the next one is warmed up.
+        _block: Block of mixed frames, if mixing is done by blocks.
+        _commands: Commands, submitted for applying on the next frame.
+        _command_lock: Lock for applying commands one by one.
+        _command_thread: Identifier of the player thread, while it applies
+            commands.
+        _connection_manager: Manager of voice connections, if provided.
+        _source_budget: Time in seconds, that one read of audio source may
+            take, if limited.
+        _budget_strikes: Amount of budget violations, after which audio
+            source is demoted or removed.
+        _budget_window: Amount of frames, within which underruns of
+            prefetched audio source are counted.
     """
 
+    # Keeps audio states compact, since there can be one for each guild.
+    __slots__ = (
+        "_key_id",
+        "_voice_client",
+        "_voice_client_disconnect_source",
+        "_loop",
+        "_audio_sources",
+        "_master_volume",
+        "_mixer",
+        "_engine",
+        "_is_opus_frame",
+        "_status",
+        "_generation",
+        "_player_lock",
+        "_idle_frames",
+        "_idle_limit",
+        "_metrics",
+        "_metrics_callback",
+        "_metrics_period",
+        "_ended",
+        "_queue",
+        "_queue_lead_time",
+        "_block",
+        "_commands",
+        "_command_lock",
+        "_command_thread",
+        "_connection_manager",
+        "_source_budget",
+        "_budget_strikes",
+        "_budget_window",
+    )
+
     _key_id: int
 
     _voice_client: Optional[discord.VoiceClient]
@@ -112,10 +583,56 @@ class AudioState(discord.AudioSource):
 
     _loop: asyncio.AbstractEventLoop
 
-    _audio_sources: Dict[discord.AudioSource, Callable]
-    _master_source: discord.PCMVolumeTransformer
+    _audio_sources: SourceRegistry
+    _master_volume: float
+    _mixer: Mixer
+    _engine: Optional[MixingEngine]
+    _is_opus_frame: bool
+
+    _status: PlayerStatus
+    _generation: int
+    _player_lock: threading.Lock
+    _idle_frames: int
+    _idle_limit: int
+
+    _metrics: Optional[AudioStateMetrics]
+    _metrics_callback: Optional[Callable]
+    _metrics_period: int
+
+    _ended: List[SourceEntry]
+
+    _queue: Optional[TrackQueue]
+    _queue_lead_time: float
+
+    _block: MixBlock
+
+    _commands: Deque[tuple]
+    _command_lock: threading.Lock
+    _command_thread: Optional[int]
+
+    _connection_manager: Optional[ConnectionManager]
 
-    def __init__(self, key_id):
+    _source_budget: Optional[float]
+    _budget_strikes: int
+    _budget_window: int
+
+    def __init__(
+        self,
+        key_id,
+        *,
+        mixer: Optional[Mixer] = None,
+        engine: Optional[MixingEngine] = None,
+        idle_timeout: float = 1.0,
+        collect_metrics: bool = False,
+        metrics_callback: Optional[Callable] = None,
+        metrics_interval: float = 10.0,
+        queue_lead_time: float = 5.0,
+        block_frames: int = 1,
+        connection_manager: Optional[ConnectionManager] = None,
+        source_budget: Optional[float] = None,
+        budget_strikes: int = 3,
+        budget_window: int = 50,
+    ):
         self._key_id = key_id
 
         self._voice_client = None
@@ -123,8 +640,43 @@ class AudioState(discord.AudioSource):
 
         self._loop = None
 
-        self._audio_sources = {}
-        self._master_source = discord.PCMVolumeTransformer(self)
+        self._audio_sources = SourceRegistry()
+        self._master_volume = 1.0
+        self._mixer = mixer if mixer is not None else default_mixer()
+        self._engine = engine
+        self._is_opus_frame = False
+
+        self._status = PlayerStatus.STOPPED
+        self._generation = 0
+        self._player_lock = threading.Lock()
+        self._idle_frames = 0
+        self._idle_limit = max(1, math.ceil(idle_timeout * 1000 / FRAME_LENGTH))
+
+        self._metrics = AudioStateMetrics() if collect_metrics else None
+        self._metrics_callback = metrics_callback
+        self._metrics_period = max(
+            1, math.ceil(metrics_interval * 1000 / FRAME_LENGTH)
+        )
+        if self._metrics is not None:
+            self._mixer.track_clipping = True
+
+        self._ended = []
+
+        self._queue = None
+        self._queue_lead_time = queue_lead_time
+
+        self._block = MixBlock(1)
+        self.block_frames = block_frames
+
+        self._commands = collections.deque()
+        self._command_lock = threading.Lock()
+        self._command_thread = None
+
+        self._connection_manager = connection_manager
+
+        self._source_budget = source_budget
+        self._budget_strikes = max(1, budget_strikes)
+        self._budget_window = max(self._budget_strikes, budget_window)
 
         log.info(
             f"Audio state initialized (Voice client key ID #{self._key_id})"
@@ -149,20 +701,112 @@ class AudioState(discord.AudioSource):
         """Guild currently connected to, if applicable."""
         return self._voice_client.guild if self._voice_client else None
 
+    @property
+    def status(self) -> PlayerStatus:
+        """Status of the player."""
+        return self._status
+
+    @property
+    def is_idle(self) -> bool:
+        """Is audio state has no voice client and no audio sources."""
+        return self._voice_client is None and len(self._audio_sources) == 0
+
+    @property
+    def metrics(self) -> Optional[AudioStateMetrics]:
+        """Real-time metrics, if collected."""
+        return self._metrics
+
+    def get_metrics(self) -> Optional[Dict[str, Any]]:
+        """Returns snapshot of real-time metrics.
+
+        Snapshot contains all fields of :class:`AudioStateMetrics` and metrics
+        of each currently playing audio source.
+
+        Returns:
+            Metrics as a dictionary, or ``None``, if metrics are not collected.
+        """
+        metrics = self._metrics
+        if metrics is None:
+            return None
+
+        entries = self._audio_sources.entries
+        result = metrics.as_dict()
+        result["key_id"] = self._key_id
+        result["status"] = self._status.name
+        result["short_fragments"] += sum(
+            entry.buffer.short_fragments for entry in entries
+        )
+        result["sources"] = [
+            {"source": repr(entry.source), **entry.metrics.as_dict()}
+            for entry in entries
+            if entry.metrics is not None
+        ]
+        return result
+
     @property
     def master_volume(self) -> float:
         """Master volume for all audio sources.
 
         Each audio source can have their own volume, if needed. Master volume
-        and audio sources' volume are independent.
+        and audio sources' volume are independent, but applied together while
+        mixing.
 
         Value is a float and can be from 0.0 to 2.0.
         """
-        return self._master_source.volume
+        return self._master_volume
 
     @master_volume.setter
     def master_volume(self, value: float):
-        self._master_source.volume = float(max(min(value, 2.0), 0.0))
+        self._master_volume = _clamp_volume(value)
+        self._audio_sources.touch()
+
+    @property
+    def block_frames(self) -> int:
+        """Amount of frames, that are mixed at once.
+
+        If more than one, frames are pulled from audio sources and mixed by
+        blocks, and then served frame by frame. It reduces overhead of the
+        mixing per frame, but adds the latency of the whole block to the
+        audio sources. If audio sources are added or removed, or volumes are
+        changed, in the middle of the block, the rest of the block is mixed
+        again, so changes are applied on the next frame.
+
+        New value is applied from the next block.
+
+        Raises:
+            ValueError: If value is not positive.
+        """
+        return self._block.frames
+
+    @block_frames.setter
+    def block_frames(self, value: int):
+        if value < 1:
+            raise ValueError("Amount of frames should be positive")
+        self._block.frames = value
+
+    async def connect(
+        self, channel: discord.abc.Connectable
+    ) -> discord.VoiceClient:
+        """Connect to the voice channel and set voice client to the state.
+
+        Connection manager is used, if provided, so connects are limited,
+        retried and coalesced.
+
+        Args:
+            channel: Channel to connect to.
+
+        Returns:
+            Connected voice client.
+
+        Raises:
+            asyncio.TimeoutError: If connect has timed out.
+        """
+        if self._connection_manager is not None:
+            voice_client = await self._connection_manager.connect(channel)
+        else:
+            voice_client = await channel.connect()
+        self.set_voice_client(voice_client)
+        return voice_client
 
     def set_voice_client(self, voice_client: discord.VoiceClient):
         """Set new voice client to the state.
@@ -207,7 +851,7 @@ class AudioState(discord.AudioSource):
 
         self._on_end(reason=AudioStatus.VOICE_CLIENT_REMOVED)
 
-        self._voice_client.stop()
+        self._stop()
         self._voice_client.disconnect = self._voice_client_disconnect_source
         self._voice_client_disconnect_source = None
         self._voice_client = None
@@ -222,33 +866,322 @@ class AudioState(discord.AudioSource):
         source: discord.AudioSource,
         *,
         finalizer: Optional[Callable] = None,
+        volume: float = 1.0,
+        prefetch: Optional[int] = None,
+        input_format: Optional[AudioFormat] = None,
     ):
         """Add audio source and transmit it via voice client.
 
-        If audio source is already present, the ``finalizer`` will be replaced.
+        If audio source is already present, the ``finalizer`` and the
+        ``volume`` will be replaced.
 
         Args:
             source: Audio source to add.
             finalizer: The finalizer that will be called in case of source is
                 removed. Possible reasons to remove is enumerated in the
                 :class:`AudioStatus`.
+            volume: Volume of the audio source. Value is a float and can be
+                from 0.0 to 2.0. There is no need to wrap audio source with
+                :class:`discord.PCMVolumeTransformer`, since volume will be
+                applied while mixing.
+            prefetch: Amount of frames to read ahead in the background
+                thread. Useful for slow audio sources, that can stall the
+                whole mix. See :class:`PrefetchSource` for details. Opus audio
+                sources are decoded while prefetching, so they are mixed as
+                PCM. If audio source is already present, this parameter is
+                ignored.
+            input_format: Format of PCM, returned by audio source, if differs
+                from the native one (16-bit 48 kHz stereo). Audio source is
+                converted in-process, see :class:`ConvertingSource`. If audio
+                source is already present, this parameter is ignored.
 
         Raises:
-            ValueError: If not a :class:`AudioSource` instance provided.
+            ValueError: If not a :class:`AudioSource` instance provided, or
+                audio source can't be converted from the ``input_format``.
             concord.ext.audio.exceptions.AudioExtensionError: If voice client is
                 not present.
+            discord.opus.OpusNotLoaded: If Opus audio source is provided, but
+                libopus, needed for decoding it, is not loaded.
         """
         if not isinstance(source, discord.AudioSource):
             raise ValueError("Not an audio source")
         if self._voice_client is None:
             raise AudioExtensionError("Voice client is not present")
-        self._audio_sources[source] = finalizer
+        reader = None
+        if source not in self._audio_sources:
+            if input_format is not None and input_format != NATIVE_FORMAT:
+                reader = ConvertingSource(source, input_format)
+            # Conversion is done in the prefetching thread too, if any.
+            if prefetch is not None:
+                if source.is_opus():
+                    # Opus packets are decoded in the prefetching thread.
+                    reader = OpusDecodingSource(source)
+                reader = PrefetchSource(reader or source, depth=prefetch)
+        self._audio_sources.add(
+            source, finalizer, _clamp_volume(volume), reader
+        )
 
         log.debug(f"Source has added (Voice client key ID #{self._key_id})")
+        self._wake()
+
+    @property
+    def queue(self) -> Optional[TrackQueue]:
+        """Queue of tracks, if created.
+
+        Queue is an audio source, so its volume can be changed the same way,
+        as for any other audio source, while it's playing.
+        """
+        return self._queue
+
+    def enqueue(
+        self,
+        factory: Callable[[], discord.AudioSource],
+        *,
+        finalizer: Optional[Callable] = None,
+        duration: Optional[float] = None,
+        descriptor: Optional[dict] = None,
+        start: float = 0.0,
+    ) -> Track:
+        """Add track to the end of the queue.
+
+        Tracks of the queue are played one after another without gaps. Queue
+        is created and added as audio source, if needed.
+
+        Args:
+            factory: Callable, that returns audio source of the track. It is
+                called in the background thread, shortly before the track is
+                played.
+            finalizer: The finalizer that will be called with the track and
+                the reason, when track is finished or removed from the queue.
+                Possible reasons are enumerated in the :class:`AudioStatus`.
+            duration: Duration of the track in seconds, if known. It is used
+                for warming up the track just in time, otherwise it is warmed
+                up right after the previous track has started.
+            descriptor: JSON-serializable description of the track, which
+                allows to recreate it. Only tracks with descriptors are saved
+                in snapshots, see :meth:`State.save_snapshot`.
+            start: Time in seconds, from which audio source of the track
+                starts, if it is resumed.
+
+        Returns:
+            Added track.
+
+        Raises:
+            concord.ext.audio.exceptions.AudioExtensionError: If voice client is
+                not present.
+        """
+        if self._voice_client is None:
+            raise AudioExtensionError("Voice client is not present")
+        if self._queue is None:
+            self._queue = TrackQueue(
+                self._loop, lead_time=self._queue_lead_time
+            )
+        track = self._queue.append(
+            factory,
+            finalizer=finalizer,
+            duration=duration,
+            descriptor=descriptor,
+            start=start,
+        )
+        # Ended queue is re-added by its finalizer, if there are new tracks.
+        if self._queue not in self._audio_sources:
+            self.add_source(self._queue, finalizer=self._on_queue_removed)
+        return track
+
+    def get_snapshot(self) -> Optional[Dict[str, Any]]:
+        """Returns JSON-serializable snapshot of the audio state.
+
+        Only audio sources, wrapped with :class:`ResumableSource`, and queued
+        tracks with descriptors are saved, since others can't be recreated.
+        Finalizers are not saved.
+
+        Returns:
+            Snapshot, or ``None``, if voice client is not present.
+        """
+        voice_client = self._voice_client
+        if voice_client is None or voice_client.channel is None:
+            return None
+
+        sources = []
+        queue_volume = 1.0
+        for entry in self._audio_sources.entries:
+            if entry.source is self._queue:
+                queue_volume = entry.volume
+            if entry.is_ended or not isinstance(entry.source, ResumableSource):
+                continue
+            source = entry.source
+            sources.append(
+                {
+                    "descriptor": source.descriptor,
+                    "position": source.position,
+                    "volume": entry.volume,
+                    "input_format": list(source.input_format),
+                    "prefetch": (
+                        entry.reader.depth
+                        if isinstance(entry.reader, PrefetchSource)
+                        else None
+                    ),
+                }
+            )
+
+        tracks = []
+        if self._queue is not None:
+            current = self._queue.current
+            for track in (current,) + self._queue.tracks:
+                if track is None or track.descriptor is None:
+                    continue
+                tracks.append(
+                    {
+                        "descriptor": track.descriptor,
+                        "position": track.elapsed,
+                        "duration": track.duration,
+                    }
+                )
+
+        return {
+            "key_id": self._key_id,
+            "channel_id": voice_client.channel.id,
+            "master_volume": self._master_volume,
+            "sources": sources,
+            "queue": tracks,
+            "queue_volume": queue_volume,
+        }
 
-        # TODO: Fast adding after player stopping can clean this source as well.
-        if self._voice_client._player is None:
-            self._voice_client.play(self._master_source)
+    async def restore_snapshot(
+        self,
+        channel: discord.abc.Connectable,
+        snapshot: Dict[str, Any],
+        resolvers: Dict[str, Resolver],
+    ):
+        """Connect to the channel and restore playback from the snapshot.
+
+        Audio sources and tracks, whose descriptor types have no resolvers,
+        are skipped.
+
+        Args:
+            channel: Channel to connect to.
+            snapshot: Snapshot of the audio state.
+            resolvers: Callables, that recreate audio sources from their
+                descriptors and positions, by the descriptor type.
+        """
+        if self._voice_client is None:
+            await self.connect(channel)
+        self.master_volume = snapshot["master_volume"]
+
+        for item in snapshot["sources"]:
+            descriptor = item["descriptor"]
+            resolver = resolvers.get(descriptor["type"])
+            if resolver is None:
+                log.warning(
+                    f"There is no resolver for {descriptor['type']} audio "
+                    f"source (Voice client key ID #{self._key_id})"
+                )
+                continue
+            input_format = AudioFormat(*item["input_format"])
+            self.add_source(
+                ResumableSource(
+                    resolver(descriptor, item["position"]),
+                    descriptor,
+                    position=item["position"],
+                    input_format=input_format,
+                ),
+                volume=item["volume"],
+                prefetch=item["prefetch"],
+                input_format=input_format,
+            )
+
+        for item in snapshot["queue"]:
+            descriptor = item["descriptor"]
+            resolver = resolvers.get(descriptor["type"])
+            if resolver is None:
+                log.warning(
+                    f"There is no resolver for {descriptor['type']} track "
+                    f"(Voice client key ID #{self._key_id})"
+                )
+                continue
+            self.enqueue(
+                functools.partial(resolver, descriptor, item["position"]),
+                duration=item["duration"],
+                descriptor=descriptor,
+                start=item["position"],
+            )
+        if self._queue is not None:
+            self.set_source_volume(self._queue, snapshot["queue_volume"])
+
+        log.info(f"Audio state restored (Voice client key ID #{self._key_id})")
+
+    def _on_queue_removed(self, queue: TrackQueue, reason: AudioStatus):
+        if reason is AudioStatus.SOURCE_ENDED:
+            if len(queue) > 0:
+                self.add_source(queue, finalizer=self._on_queue_removed)
+            return
+        if queue is self._queue:
+            self._queue = None
+        queue.clear(reason=reason)
+
+    def get_source_volume(self, source: discord.AudioSource) -> float:
+        """Returns volume of the audio source.
+
+        Args:
+            source: Audio source to get volume of.
+
+        Raises:
+            KeyError: If source is not present.
+        """
+        entry = self._audio_sources.get(source)
+        if entry is None:
+            raise KeyError(source)
+        return entry.volume
+
+    def get_prefetch_source(
+        self, source: discord.AudioSource
+    ) -> Optional[PrefetchSource]:
+        """Returns prefetching wrapper of the audio source, if any.
+
+        It can be used to inspect buffer depth and underruns counter.
+
+        Args:
+            source: Audio source, added with prefetching.
+
+        Raises:
+            KeyError: If source is not present.
+        """
+        entry = self._audio_sources.get(source)
+        if entry is None:
+            raise KeyError(source)
+        if isinstance(entry.reader, PrefetchSource):
+            return entry.reader
+        return None
+
+    def get_budget_violations(self, source: discord.AudioSource) -> int:
+        """Returns amount of reads of the audio source over the budget.
+
+        Args:
+            source: Audio source to get budget violations of.
+
+        Raises:
+            KeyError: If source is not present.
+        """
+        entry = self._audio_sources.get(source)
+        if entry is None:
+            raise KeyError(source)
+        return entry.budget_violations
+
+    def set_source_volume(self, source: discord.AudioSource, volume: float):
+        """Set volume of the audio source.
+
+        Args:
+            source: Audio source to set volume of.
+            volume: New volume. Value is a float and can be from 0.0 to 2.0.
+
+        Raises:
+            KeyError: If source is not present.
+        """
+        entry = self._audio_sources.get(source)
+        if entry is None:
+            raise KeyError(source)
+        entry.volume = _clamp_volume(volume)
+        self._audio_sources.touch()
 
     def remove_source(
         self, source: discord.AudioSource, *, reason=AudioStatus.SOURCE_REMOVED
@@ -262,15 +1195,170 @@ class AudioState(discord.AudioSource):
         Raises:
             KeyError: If source is not present.
         """
-        finalizer = self._audio_sources.pop(source)
-        finalizer(source, reason)
+        entry = self._audio_sources.pop(source)
+        if self._metrics is not None:
+            self._metrics.short_fragments += entry.buffer.short_fragments
+        if isinstance(entry.reader, PrefetchSource):
+            entry.reader.close()
+        if isinstance(entry.source, ProcessSource):
+            # Worker process is busy with the source until its ring is closed.
+            entry.source.close()
+        if entry.finalizer is not None:
+            # Finalizers are always called in the loop.
+            if self._command_thread == threading.get_ident():
+                self._loop.call_soon_threadsafe(entry.finalizer, source, reason)
+            else:
+                entry.finalizer(source, reason)
         log.debug(f"Source has removed (Voice client key ID #{self._key_id})")
 
+    def _wake(self):
+        with self._player_lock:
+            if self._status is PlayerStatus.STOPPED:
+                self._generation += 1
+                if self._engine is not None:
+                    self._engine.attach(self)
+                else:
+                    self._voice_client.play(
+                        self,
+                        after=functools.partial(
+                            self._on_player_end, self._generation
+                        ),
+                    )
+            elif self._status is PlayerStatus.SUSPENDED:
+                if self._engine is not None:
+                    self._engine.attach(self)
+                else:
+                    self._voice_client.resume()
+                log.debug(
+                    f"Player has resumed (Voice client key ID #{self._key_id})"
+                )
+            else:
+                return
+            self._status = PlayerStatus.PLAYING
+
+    def _set_status(self, expected: PlayerStatus, status: PlayerStatus):
+        # Player thread changes status only if it has not been changed from
+        # the loop in the meantime, like when player is stopped.
+        with self._player_lock:
+            if self._status is expected:
+                self._status = status
+
+    def _suspend(self):
+        with self._player_lock:
+            # Audio source may be added right before.
+            if len(self._audio_sources) > 0 or len(self._commands) > 0:
+                return
+            if self._status is not PlayerStatus.IDLE:
+                return
+            self._status = PlayerStatus.SUSPENDED
+            if self._engine is not None:
+                self._engine.detach(self)
+            else:
+                self._voice_client.pause()
+
+        log.debug(f"Player has suspended (Voice client key ID #{self._key_id})")
+
+    def _stop(self):
+        with self._player_lock:
+            self._status = PlayerStatus.STOPPED
+            if self._engine is not None:
+                self._engine.detach(self)
+            self._voice_client.stop()
+
+    def _on_player_end(self, generation: int, error: Optional[Exception]):
+        with self._player_lock:
+            if generation != self._generation:
+                return
+            if self._status is PlayerStatus.STOPPED:
+                return
+            self._status = PlayerStatus.STOPPED
+            # Only audio sources, played by this player, should be cleaned.
+            entries = self._audio_sources.entries
+
+        if error is not None:
+            log.error(
+                f"Player has failed (Voice client key ID #{self._key_id})",
+                exc_info=error,
+            )
+        self._loop.call_soon_threadsafe(
+            functools.partial(
+                self._remove_entries, entries, reason=AudioStatus.SOURCE_CLEANED
+            )
+        )
+        if len(self._commands) > 0:
+            self._loop.call_soon_threadsafe(self._apply_commands)
+
+    def submit(
+        self, function: Callable, *args, **kwargs
+    ) -> concurrent.futures.Future:
+        """Submit a command, that controls audio state, from any thread.
+
+        Command is a call of the ``function`` (usually, a method of the audio
+        state, like :meth:`add_source`) with given arguments. Commands are
+        applied in order of submission at the start of the next frame, so
+        they never race with the mixing. If player is not ticking (it is
+        stopped or suspended), commands are applied in the loop instead.
+
+        Finalizers of audio sources, removed by commands, are called in the
+        loop.
+
+        Submitting is lock-free for the player, so audio state can be driven
+        from worker threads with no overhead for the mixing.
+
+        Args:
+            function: Callable to call.
+            *args: Positional arguments of the callable.
+            **kwargs: Keyword arguments of the callable.
+
+        Returns:
+            Future with the result of the call. It can be awaited in the loop
+            with :func:`asyncio.wrap_future`.
+        """
+        future = concurrent.futures.Future()
+        self._commands.append((future, function, args, kwargs))
+
+        with self._player_lock:
+            is_ticking = self._status in (
+                PlayerStatus.PLAYING,
+                PlayerStatus.IDLE,
+            )
+        if is_ticking:
+            return future
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._apply_commands)
+        else:
+            # There is no player and no loop without voice client.
+            self._apply_commands()
+        return future
+
+    def _apply_commands(self, *, from_player: bool = False):
+        with self._command_lock:
+            if from_player:
+                self._command_thread = threading.get_ident()
+            try:
+                while len(self._commands) > 0:
+                    future, function, args, kwargs = self._commands.popleft()
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        result = function(*args, **kwargs)
+                    except Exception as exception:
+                        future.set_exception(exception)
+                    else:
+                        future.set_result(result)
+            finally:
+                self._command_thread = None
+
+    def _remove_entries(self, entries, *, reason=AudioStatus.SOURCE_REMOVED):
+        for entry in entries:
+            if self._audio_sources.get(entry.source) is entry:
+                self.remove_source(entry.source, reason=reason)
+
     def _on_end(self, *, reason=AudioStatus.SOURCE_REMOVED):
         while len(self._audio_sources) > 0:
-            for source in self._audio_sources:
+            for entry in self._audio_sources:
                 try:
-                    self.remove_source(source, reason=reason)
+                    self.remove_source(entry.source, reason=reason)
                 except KeyError:
                     continue
 
@@ -279,38 +1367,329 @@ class AudioState(discord.AudioSource):
         self._on_end(reason=AudioStatus.VOICE_CLIENT_DISCONNECTED)
         self.remove_voice_client()
 
+    def _on_source_end(self, entry: SourceEntry):
+        # Ended source is skipped right away, but it will be removed in the
+        # loop with others, ended on the same frame.
+        entry.is_ended = True
+        self._ended.append(entry)
+
+    def _flush_ended(self):
+        ended, self._ended = self._ended, []
+        loop = self._loop
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(
+            functools.partial(
+                self._remove_entries, ended, reason=AudioStatus.SOURCE_ENDED
+            )
+        )
+
+    def is_opus(self) -> bool:
+        # Player asks for it after each read.
+        return self._is_opus_frame
+
     def read(self) -> bytes:
+        if len(self._commands) > 0:
+            self._apply_commands(from_player=True)
+
+        metrics = self._metrics
+        if metrics is None:
+            data = self._mix(None)
+            if self._ended:
+                self._flush_ended()
+            return data
+
+        start = time.perf_counter()
+        data = self._mix(metrics)
+        metrics.mix_time.observe(time.perf_counter() - start)
+
+        metrics.frames += 1
+        metrics.active_sources = len(self._audio_sources)
+        metrics.clipped_samples = self._mixer.clipped_samples
+        if data is OPUS_SILENCE:
+            metrics.idle_frames += 1
+        elif self._is_opus_frame:
+            metrics.opus_frames += 1
+
+        if (
+            self._metrics_callback is not None
+            and metrics.frames % self._metrics_period == 0
+        ):
+            self._loop.call_soon_threadsafe(self._report_metrics)
+        if self._ended:
+            self._flush_ended()
+        return data
+
+    def _report_metrics(self):
+        try:
+            self._metrics_callback(self, self.get_metrics())
+        except Exception:
+            log.exception("Exception while reporting metrics")
+
+    def _pull_measured(
+        self, entry: SourceEntry, metrics: Optional[AudioStateMetrics]
+    ) -> Optional[Union[bytes, memoryview]]:
+        start = time.perf_counter()
+        fragment = entry.buffer.pull(entry.pcm_reader)
+        elapsed = time.perf_counter() - start
+
+        if metrics is not None:
+            if entry.metrics is None:
+                entry.metrics = SourceMetrics()
+            entry.metrics.read_time.observe(elapsed)
+            # Prefetching sources return exactly this object, if not ready.
+            if fragment is SILENCE:
+                entry.metrics.underruns += 1
+                metrics.underruns += 1
+        if self._source_budget is None:
+            return fragment
+        if isinstance(entry.reader, PrefetchSource):
+            self._on_prefetched(entry, fragment, metrics)
+        elif elapsed > self._source_budget:
+            self._on_over_budget(entry, metrics)
+        return fragment
+
+    def _count_violation(
+        self, entry: SourceEntry, metrics: Optional[AudioStateMetrics]
+    ):
+        entry.budget_violations += 1
+        if metrics is not None:
+            metrics.budget_violations += 1
+            if entry.metrics is not None:
+                entry.metrics.budget_violations += 1
+
+    def _on_over_budget(
+        self, entry: SourceEntry, metrics: Optional[AudioStateMetrics]
+    ):
+        self._count_violation(entry, metrics)
+        # Removed source can be still pulled till the end of the block.
+        if entry.is_ended:
+            return
+        if entry.budget_violations % self._budget_strikes != 0:
+            return
+
+        # Frames that are already buffered are played first.
+        reader = PrefetchSource(entry.pcm_reader)
+        if not self._audio_sources.replace_reader(entry, reader):
+            reader.close()
+            return
+        # Demoted source has been playing, so it underruns only if stalled.
+        entry.track_underruns(self._budget_strikes)
+        log.warning(
+            f"Source {entry.source!r} is over the budget "
+            f"{entry.budget_violations} times, it will be read in "
+            f"the background (Voice client key ID #{self._key_id})"
+        )
+
+    def _on_prefetched(
+        self,
+        entry: SourceEntry,
+        fragment: Optional[Union[bytes, memoryview]],
+        metrics: Optional[AudioStateMetrics],
+    ):
+        entry.reads += 1
+        underrun_reads = entry.underrun_reads
+        if fragment is not SILENCE:
+            if underrun_reads is None:
+                entry.track_underruns(self._budget_strikes)
+            return
+        # Background thread may still be opening the source.
+        if underrun_reads is None:
+            return
+        underrun_reads.append(entry.reads)
+        self._count_violation(entry, metrics)
+        if entry.is_ended or len(underrun_reads) < self._budget_strikes:
+            return
+        # Only the last underruns are kept, so the oldest one is compared.
+        if entry.reads - underrun_reads[0] >= self._budget_window:
+            return
+
+        log.warning(
+            f"Source {entry.source!r} has underrun "
+            f"{len(underrun_reads)} times within {self._budget_window} "
+            f"frames, it will be removed (Voice client key ID #{self._key_id})"
+        )
+        entry.is_ended = True
+        self._loop.call_soon_threadsafe(
+            functools.partial(
+                self._remove_entries,
+                (entry,),
+                reason=AudioStatus.SOURCE_OVER_BUDGET,
+            )
+        )
+
+    def _mix(self, metrics: Optional[AudioStateMetrics]) -> bytes:
+        master_volume = self._master_volume
+        # Snapshot is immutable, so it's safe to iterate it while sources are
+        # added or removed from the loop.
+        entries = self._audio_sources.entries
+
+        if len(entries) == 0:
+            if self._block.length > 0:
+                self._block.reset()
+            return self._read_idle()
+        if self._status is PlayerStatus.IDLE:
+            self._set_status(PlayerStatus.IDLE, PlayerStatus.PLAYING)
+        self._idle_frames = 0
+
+        if len(entries) == 1 and master_volume == 1.0:
+            entry = entries[0]
+            # Decoded bytes should be played first, if we have switched from
+            # mixing just now.
+            if entry.is_ended:
+                return self._read_idle()
+            if (
+                entry.is_opus
+                and entry.volume == 1.0
+                and entry.buffer.is_empty
+                and self._block.is_exhausted
+            ):
+                if self._source_budget is None:
+                    packet = entry.reader.read()
+                else:
+                    start = time.perf_counter()
+                    packet = entry.reader.read()
+                    if time.perf_counter() - start > self._source_budget:
+                        self._on_over_budget(entry, metrics)
+                if len(packet) == 0:
+                    self._on_source_end(entry)
+                    return self._read_idle()
+                self._is_opus_frame = True
+                return packet
+
+        self._is_opus_frame = False
+        if self._block.frames > 1 or not self._block.is_exhausted:
+            return self._mix_block(entries, metrics)
+
         fragments = []
+        gains = []
+        is_unity = master_volume == 1.0
+        is_measured = metrics is not None or self._source_budget is not None
 
-        # TODO: We need to fix this somehow...
-        # Copying dict each time is not a good way
-        for source in self._audio_sources.copy():
-            fragment = source.read()
-            if len(fragment) == 0:
-                self._loop.call_soon_threadsafe(
-                    functools.partial(
-                        self.remove_source,
-                        source,
-                        reason=AudioStatus.SOURCE_ENDED,
-                    )
-                )
+        for entry in entries:
+            if entry.is_ended:
+                continue
+            if not is_measured:
+                fragment = entry.buffer.pull(entry.pcm_reader)
+            else:
+                fragment = self._pull_measured(entry, metrics)
+            if fragment is None:
+                self._on_source_end(entry)
                 continue
             fragments.append(fragment)
+            gain = entry.volume * master_volume
+            gains.append(gain)
+            if gain != 1.0:
+                is_unity = False
 
         if len(fragments) == 0:
-            return b""
-        min_size = functools.reduce(
-            lambda x, y: min(x, len(y)), fragments, len(fragments[0])
-        )
-        fragments = [
-            fragment[0:min_size] if len(fragment) > min_size else fragment
-            for fragment in fragments
-        ]
+            return self._read_idle()
+        #
+        # Multiplication is skipped at all, if there is nothing to scale.
+        return self._mixer.mix(fragments, None if is_unity else gains)
+
+    def _mix_block(
+        self, entries, metrics: Optional[AudioStateMetrics]
+    ) -> bytes:
+        block = self._block
+        # Registry counts volume changes as well, so one int is compared.
+        key = self._audio_sources.changes
+        if block.is_exhausted or key != block.key:
+            if not self._fill_block(entries, key, metrics):
+                return self._read_idle()
+
+        index = block.index
+        is_playing = False
+        for entry, (_, end) in block.raw.items():
+            # Audio source is ended on the frame, it has not filled.
+            if end == index:
+                self._on_source_end(entry)
+            elif end is None or end > index:
+                is_playing = True
+        if not is_playing:
+            # The rest of the block is empty, so it's idle like per frame.
+            block.reset()
+            return self._read_idle()
+        return block.next_frame()
+
+    def _fill_block(
+        self, entries, key: int, metrics: Optional[AudioStateMetrics]
+    ) -> bool:
+        block = self._block
+        if block.is_exhausted:
+            start, length = 0, block.frames
+        else:
+            # The rest of the block is mixed again with changes applied.
+            start, length = block.index, block.length
+        master_volume = self._master_volume
+
+        raw = {}
+        fragments = []
+        gains = []
+        is_unity = master_volume == 1.0
 
-        return functools.reduce(lambda x, y: audioop.add(x, y, 2), fragments)
+        for entry in entries:
+            pulled = block.raw.get(entry) if start > 0 else None
+            if pulled is None:
+                if entry.is_ended:
+                    continue
+                pulled = self._pull_block(entry, start, length, metrics)
+                if pulled is None:
+                    self._on_source_end(entry)
+                    continue
+            raw[entry] = pulled
+            fragments.append(
+                pulled[0][start * FRAME_SIZE : length * FRAME_SIZE]
+            )
+            gain = entry.volume * master_volume
+            gains.append(gain)
+            if gain != 1.0:
+                is_unity = False
+
+        if len(fragments) == 0:
+            block.reset()
+            return False
+
+        block.data = self._mixer.mix(fragments, None if is_unity else gains)
+        block.offset = block.index = start
+        block.length = length
+        block.key = key
+        block.raw = raw
+        return True
+
+    def _pull_block(
+        self,
+        entry: SourceEntry,
+        start: int,
+        length: int,
+        metrics: Optional[AudioStateMetrics],
+    ) -> Optional[tuple]:
+        data = memoryview(bytearray(length * FRAME_SIZE))
+        is_measured = metrics is not None or self._source_budget is not None
+        for index in range(start, length):
+            if not is_measured:
+                fragment = entry.buffer.pull(entry.pcm_reader)
+            else:
+                fragment = self._pull_measured(entry, metrics)
+            if fragment is None:
+                if index == start:
+                    return None
+                return data, index
+            data[index * FRAME_SIZE : (index + 1) * FRAME_SIZE] = fragment
+        return data, None
+
+    def _read_idle(self) -> bytes:
+        if self._status is PlayerStatus.PLAYING:
+            self._set_status(PlayerStatus.PLAYING, PlayerStatus.IDLE)
+        self._idle_frames += 1
+        if self._idle_frames >= self._idle_limit:
+            self._suspend()
+
+        self._is_opus_frame = True
+        return OPUS_SILENCE
 
     def cleanup(self):
-        self._voice_client.stop()
-        self._loop.call_soon_threadsafe(
-            functools.partial(self._on_end, reason=AudioStatus.SOURCE_CLEANED)
-        )
+        # Player's ``after`` callback is used instead, since it's called with
+        # an exception, if any.
+        if self._engine is not None:
+            self._on_player_end(self._generation, None)
@@ -0,0 +1,50 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2017-2018 Nariman Safiulin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import enum
+
+
+class AudioStatus(enum.Enum):
+    SOURCE_ENDED = enum.auto()
+    SOURCE_CLEANED = enum.auto()
+    SOURCE_REMOVED = enum.auto()
+    VOICE_CLIENT_DISCONNECTED = enum.auto()
+    VOICE_CLIENT_REMOVED = enum.auto()
+    SOURCE_OVER_BUDGET = enum.auto()
+
+
+class PlayerStatus(enum.Enum):
+    """Status of the audio state's player.
+
+    Attributes:
+        STOPPED: Player is not started.
+        PLAYING: Player is playing audio sources.
+        IDLE: There is no audio sources, player is sending silence.
+        SUSPENDED: Player is paused after being idle for a while, no work is
+            done until audio source is added.
+    """
+
+    STOPPED = enum.auto()
+    PLAYING = enum.auto()
+    IDLE = enum.auto()
+    SUSPENDED = enum.auto()